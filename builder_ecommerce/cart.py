@@ -1,45 +1,82 @@
 import frappe
+import hashlib
 import json
 from frappe import _
 from frappe.contacts.doctype.contact.contact import get_contact_name
-from frappe.contacts.doctype.address.address import get_address_display
 from frappe.utils import cint, cstr, flt, get_fullname
 from frappe.utils.nestedset import get_root_of
 from erpnext.selling.doctype.quotation.quotation import _make_sales_order
 
-
-def _get_cart_quotation(party=None, contact=None):
+from builder_ecommerce.ecommerce.shopping_cart.addresses import get_party_address, get_party_addresses
+from builder_ecommerce.ecommerce.shopping_cart.cart_lines import (
+    apply_cart_line_change,
+    discard_pending_cart,
+    get_pending_cart,
+    get_pending_lines,
+    is_deferred_save_enabled,
+    new_pending_cart,
+    update_pending_cart,
+)
+from builder_ecommerce.ecommerce.shopping_cart.checkout import (
+    COMPLETED,
+    FAILED,
+    PROCESSING,
+    QUEUED,
+    get_checkout,
+    new_checkout,
+    update_checkout,
+)
+from builder_ecommerce.ecommerce.shopping_cart.checkout_config import get_checkout_config
+from builder_ecommerce.ecommerce.shopping_cart.cart_session import get_cart_session, update_cart_session
+from builder_ecommerce.ecommerce.shopping_cart.guest_cart import (
+    apply_guest_cart_change,
+    clear_guest_cart,
+    get_guest_cart,
+    update_guest_cart,
+)
+from builder_ecommerce.ecommerce.shopping_cart.guest_customers import find_guest_party
+from builder_ecommerce.ecommerce.shopping_cart.idempotency import run_once
+from builder_ecommerce.ecommerce.shopping_cart.item_details import get_item_details
+from builder_ecommerce.ecommerce.shopping_cart.item_prices import (
+    apply_current_prices,
+    get_default_price_list,
+    get_item_prices,
+)
+from builder_ecommerce.ecommerce.shopping_cart.totals import get_guest_totals
+
+
+def _get_cart_quotation(party=None, contact=None, fold_pending=False):
     """
     Retrieve or create a "Shopping Cart" Quotation for the given party and contact.
 
     If no existing quotation is found, a new one is created with default values.
+    Cart changes still pending from deferred saves are shown on it, and saved
+    into it when `fold_pending` is set.
 
     Args:
         party (Optional[Party]): The party for the quotation. Defaults to the current user's party.
         contact (Optional[str]): The contact for the quotation. Defaults to the contact linked to the user's email.
+        fold_pending (bool): Save the pending cart changes into the Quotation, which is read with
+                             a row lock. Only for requests that commit, i.e. POST requests and
+                             background jobs; reads apply them in memory only.
 
     Returns:
         frappe.model.document.Document: The Quotation document.
     """
-    if not party:
-        party = get_party()
+    quotation_name = _get_cart_quotation_name(party)
+    qdoc = None
 
-    quotation = frappe.get_all(
-        "Quotation",
-        fields=["name"],
-        filters={
-            "party_name": party.name,
-            "contact_email": frappe.session.user,
-            "order_type": "Shopping Cart",
-            "docstatus": 0,
-        },
-        order_by="modified desc",
-        limit_page_length=1,
-    )
+    if quotation_name:
+        if fold_pending:
+            # locked, so it is read as committed and concurrent saves of the cart wait for this one
+            qdoc = _fold_pending_cart(_get_quotation_for_update(quotation_name))
+        else:
+            qdoc = _show_pending_cart(frappe.get_doc("Quotation", quotation_name))
+
+    if not qdoc:
+        if not party:
+            party = get_party()
 
-    if quotation:
-        qdoc = frappe.get_doc("Quotation", quotation[0].name)
-    else:
         company = frappe.defaults.get_defaults().company
         qdoc = frappe.get_doc(
             {
@@ -72,19 +109,235 @@ def _get_cart_quotation(party=None, contact=None):
     return qdoc
 
 
+def _get_cart_quotation_name(party=None):
+    """
+    Return the name of the draft "Shopping Cart" Quotation of the current user, if any.
+
+    The party and quotation of logged-in users are cached per user, so repeat
+    calls skip resolving the party and searching Quotations. The cache is
+    cleared by Quotation, Contact and Customer events, and a cached quotation
+    is only used while it is still a draft cart, checked with a primary key read.
+    """
+    user = frappe.session.user
+    if user != "Guest":
+        session = get_cart_session(user)
+        if (
+            session.get("quotation")
+            and (not party or session.get("party") == (party.doctype, party.name))
+            and _is_cart_quotation(session["quotation"])
+        ):
+            return session["quotation"]
+
+    if not party:
+        party = get_party()
+
+    quotation = frappe.get_all(
+        "Quotation",
+        fields=["name"],
+        filters={
+            "party_name": party.name,
+            "contact_email": frappe.session.user,
+            "order_type": "Shopping Cart",
+            "docstatus": 0,
+        },
+        order_by="modified desc",
+        limit_page_length=1,
+    )
+
+    if not quotation:
+        return None
+
+    if user != "Guest":
+        update_cart_session(user, party=(party.doctype, party.name), quotation=quotation[0].name)
+
+    return quotation[0].name
+
+
+def _get_quotation_for_update(quotation_name):
+    """
+    Load a Quotation with its row and items locked, as committed by other transactions.
+
+    get_doc(for_update=True) only locks and reads the parent row with a locking read;
+    the items come from a plain SELECT, which returns the snapshot of this transaction,
+    fixed by its first read. The items are read again with a locking read, so changes
+    are applied to the quantities other requests committed.
+    """
+    quotation = frappe.get_doc("Quotation", quotation_name, for_update=True)
+    quotation.set(
+        "items",
+        frappe.db.sql(
+            """
+            SELECT *
+            FROM `tabQuotation Item`
+            WHERE parent = %s AND parenttype = 'Quotation' AND parentfield = 'items'
+            ORDER BY idx
+            FOR UPDATE
+            """,
+            quotation_name,
+            as_dict=True,
+        ),
+    )
+    return quotation
+
+
+def _is_cart_quotation(quotation_name):
+    """Whether the Quotation is still a draft shopping cart, i.e. was not submitted or deleted since it was cached."""
+    quotation = frappe.db.get_value("Quotation", quotation_name, ["docstatus", "order_type"], as_dict=True)
+    return bool(quotation) and quotation.docstatus == 0 and quotation.order_type == "Shopping Cart"
+
+
+def _fold_pending_cart(quotation):
+    """
+    Fold the pending cart changes of the current user into the cart Quotation and save it once.
+
+    The pending cart is only deleted after the save is committed, and only if no
+    click changed it meanwhile, see discard_pending_cart.
+
+    Args:
+        quotation (frappe.model.document.Document): The cart Quotation.
+
+    Returns:
+        Optional[frappe.model.document.Document]: The Quotation, or None if the changes emptied and deleted it.
+    """
+    pending = get_pending_cart()
+    if not pending:
+        return quotation
+
+    user = frappe.session.user
+    if pending["quotation"] != quotation.name:
+        # the changes were made to a cart that is gone
+        discard_pending_cart(pending, user)
+        return quotation
+
+    _set_quotation_lines(quotation, pending["lines"])
+
+    quotation.flags.ignore_permissions = True
+    if not quotation.items:
+        quotation.delete(ignore_permissions=True)
+        quotation = None
+    else:
+        quotation.payment_schedule = []
+        quotation.save(ignore_version=True)
+
+    frappe.db.after_commit.add(lambda: discard_pending_cart(pending, user))
+    return quotation
+
+
+def _show_pending_cart(quotation):
+    """
+    Apply the pending cart changes of the current user to the cart Quotation in memory.
+
+    Nothing is saved: read requests are rolled back, and the pending cart stays
+    until a request that commits folds it. New lines get their name, image and
+    rate from the item details and the pending cart.
+
+    Args:
+        quotation (frappe.model.document.Document): The cart Quotation.
+
+    Returns:
+        frappe.model.document.Document: The Quotation, with no items if the changes emptied it.
+    """
+    pending = get_pending_cart()
+    if not pending or pending["quotation"] != quotation.name:
+        return quotation
+
+    lines = pending["lines"]
+    new_item_codes = _set_quotation_lines(quotation, lines)
+    items_details = get_item_details(new_item_codes)
+
+    for item in quotation.items:
+        if item.item_code in new_item_codes:
+            item_details = items_details.get(item.item_code) or frappe._dict()
+            item.update(
+                {
+                    "item_name": item_details.item_name,
+                    "image": item_details.image,
+                    "uom": item_details.stock_uom,
+                    "stock_uom": item_details.stock_uom,
+                    "conversion_factor": 1,
+                    "price_list_rate": lines[item.item_code]["rate"],
+                    "rate": lines[item.item_code]["rate"],
+                }
+            )
+        item.amount = flt(item.qty) * flt(item.rate)
+
+    quotation.total_qty = sum(flt(item.qty) for item in quotation.items)
+    return quotation
+
+
+def _set_quotation_lines(quotation, lines):
+    """
+    Make the items of the Quotation match the pending lines, in place.
+
+    Returns:
+        list: The codes of the items that were not on the Quotation yet.
+    """
+    for item in list(quotation.items):
+        if item.item_code not in lines:
+            quotation.remove(item)
+
+    existing_items = {item.item_code: item for item in quotation.items}
+    new_item_codes = []
+    for item_code, line in lines.items():
+        if item_code in existing_items:
+            existing_items[item_code].qty = line["qty"]
+            existing_items[item_code].additional_notes = line["additional_notes"]
+        else:
+            quotation.append(
+                "items",
+                {
+                    "doctype": "Quotation Item",
+                    "item_code": item_code,
+                    "qty": line["qty"],
+                    "additional_notes": line["additional_notes"],
+                },
+            )
+            new_item_codes.append(item_code)
+
+    return new_item_codes
+
+
+def _update_pending_cart(operations, quotation_name=None):
+    """
+    Record cart changes in the pending cart without saving the Quotation (deferred save mode).
+
+    Args:
+        operations (list): Dicts with item_code, action, qty and optionally additional_notes and update_notes.
+        quotation_name (Optional[str]): The Quotation the changes are meant for, if the caller knows it.
+
+    Returns:
+        Optional[dict]: The pending cart, or None if the user has no cart Quotation yet, or
+                        `quotation_name` is another Quotation, in which case the changes have
+                        to be applied the regular way.
+    """
+    pending = get_pending_cart()
+    cart_quotation = pending["quotation"] if pending else _get_cart_quotation_name()
+    if not cart_quotation or (quotation_name and quotation_name != cart_quotation):
+        return None
+
+    def apply(current):
+        current = current or new_pending_cart(cart_quotation)
+        for op in operations:
+            apply_cart_line_change(current, **op)
+        return current
+
+    return update_pending_cart(apply)
+
+
 @frappe.whitelist(allow_guest=True)
 def update_cart(item_code, qty, additional_notes=None, cart_items=None):
     """
     Update the shopping cart for the guest or logged-in user.
 
-    - For guest users, cart items are stored in cookies and updated accordingly.
-    - For logged-in users, the cart is managed through an existing Quotation.
+    - For guest users, cart items are stored in cookies, or server-side when enabled, and updated accordingly.
+    - For logged-in users, the cart is managed through an existing Quotation. With deferred
+      saves enabled the change is only recorded, and folded into the Quotation when it is next loaded.
 
     Args:
         item_code (str): The code of the item to update.
         qty (int or float): The quantity of the item.
         additional_notes (Optional[str]): Additional notes for the item.
-        cart_items (Optional[List[dict]]): The cart items (for guest users).
+        cart_items (Optional[List[dict]]): The cart items (for guest users without a server-side cart).
 
     Returns:
         dict: A dictionary containing the updated cart or quotation name.
@@ -95,61 +348,40 @@ def update_cart(item_code, qty, additional_notes=None, cart_items=None):
     if frappe.session.user == "Guest":
         """Updates the cart stored in cookies for guest users"""
 
-        cart_items = json.loads(cart_items) if cart_items else []
-
-        existing_item = next((item for item in cart_items if item["item_code"] == item_code), None)
-
-        item_price = frappe.db.get_value("Item Price", {"item_code": item_code, "selling": 1}, "price_list_rate")
-        if existing_item:
-            existing_item["qty"] += int(qty)
-        else:
-            cart_items.append(
-                {"item_code": item_code, "qty": int(qty),
-                 "price": flt(item_price),
-                 "notes": additional_notes})
-
-        frappe.local.cookie_manager.set_cookie("cart_items", json.dumps(cart_items))
+        item_price = get_item_prices(get_default_price_list(), [item_code]).get(item_code)
+        cart_items = update_guest_cart(
+            lambda items: apply_guest_cart_change(
+                items, item_code, "add", qty, price=flt(item_price), notes=additional_notes
+            ),
+            cart_items,
+        )
         set_cart_count(cart_items=cart_items)
 
         return {"name": cart_items}
 
-    quotation = _get_cart_quotation()
-
-    empty_card = False
     qty = flt(qty)
-    if qty == 0:
-        quotation_items = quotation.get("items", {"item_code": ["!=", item_code]})
-        if quotation_items:
-            quotation.set("items", quotation_items)
-        else:
-            empty_card = True
+    operations = [
+        {
+            "item_code": item_code,
+            "action": "add" if qty else "delete",
+            "qty": qty,
+            "additional_notes": additional_notes,
+            "update_notes": True,
+        }
+    ]
 
-    else:
-        quotation_items = quotation.get("items", {"item_code": item_code})
-        if not quotation_items:
-            quotation.append(
-                "items",
-                {
-                    "doctype": "Quotation Item",
-                    "item_code": item_code,
-                    "qty": qty,
-                    "additional_notes": additional_notes
-                },
-            )
-        else:
-            quotation_items[0].qty += qty
-            quotation_items[0].additional_notes = additional_notes
+    if is_deferred_save_enabled():
+        pending = _update_pending_cart(operations)
+        if pending:
+            set_cart_count(cart_lines=get_pending_lines(pending))
+            return {"name": pending["quotation"]}
 
-    quotation.flags.ignore_permissions = True
-    quotation.payment_schedule = []
-    if not empty_card:
-        quotation.save(ignore_version=True)
-    else:
-        quotation.delete()
-        quotation = None
+    quotation = _update_cart_quotation(operations)
+    if not quotation:
+        set_cart_count(cart_lines=[])
+        return {"name": None}
 
     set_cart_count(quotation=quotation)
-
     return {"name": quotation.name}
 
 
@@ -158,6 +390,8 @@ def get_party(user=None):
     Retrieve the party (Customer or Supplier) associated with the given user.
 
     If the user doesn't have an associated party, a new Customer and Contact record is created.
+    The user => party mapping is cached, and a missing Portal User row on the party is added by a
+    background job instead of saving the party here.
 
     Args:
         user (Optional[str]): The user for whom the party is to be fetched. Defaults to the current session user.
@@ -168,25 +402,10 @@ def get_party(user=None):
     if not user:
         user = frappe.session.user
 
-    contact_name = get_contact_name(user)
-    party = None
-
-    if contact_name:
-        contact = frappe.get_doc("Contact", contact_name)
-        if contact.links:
-            party_doctype = contact.links[0].link_doctype
-            party = contact.links[0].link_name
+    party = get_party_link(user)
 
     if party:
-        doc = frappe.get_doc(party_doctype, party)
-        if doc.doctype in ["Customer", "Supplier"]:
-            if not frappe.db.exists("Portal User", {"parent": doc.name, "user": user}):
-                doc.append("portal_users", {"user": user})
-                doc.flags.ignore_permissions = True
-                doc.flags.ignore_mandatory = True
-                doc.save()
-
-        return doc
+        return frappe.get_cached_doc(*party)
 
     else:
         # frappe.local.flags.redirect_location = "/contact"
@@ -214,16 +433,84 @@ def get_party(user=None):
         contact.flags.ignore_mandatory = True
         contact.insert(ignore_permissions=True)
 
+        # cached once committed, a rolled back request must not leave the session pointing at it
+        frappe.db.after_commit.add(lambda: update_cart_session(user, party=(customer.doctype, customer.name)))
         return customer
 
 
-def set_cart_count(quotation=None, cart_items=None):
+def get_party_link(user):
+    """
+    Return the (doctype, name) of the party linked to the user's Contact, or None.
+
+    Read from the cart session cache; on a miss it is resolved with two queries and cached.
+    """
+    party = get_cart_session(user).get("party")
+    if party:
+        return party
+
+    contact_name = get_contact_name(user)
+    if not contact_name:
+        return None
+
+    links = frappe.get_all(
+        "Dynamic Link",
+        filters={"parenttype": "Contact", "parentfield": "links", "parent": contact_name},
+        fields=["link_doctype", "link_name"],
+        order_by="idx asc",
+        limit_page_length=1,
+    )
+    if not links:
+        return None
+
+    party = (links[0].link_doctype, links[0].link_name)
+    if party[0] in ["Customer", "Supplier"] and not frappe.db.exists(
+        "Portal User", {"parent": party[1], "user": user}
+    ):
+        # enqueued right away: the party is cached below and not checked again, even
+        # when this request is rolled back, e.g. a GET. The party is already committed.
+        frappe.enqueue(
+            "builder_ecommerce.cart.add_portal_user",
+            party_doctype=party[0],
+            party_name=party[1],
+            user=user,
+            job_id=f"add_portal_user::{user}",
+            deduplicate=True,
+        )
+
+    update_cart_session(user, party=party)
+    return party
+
+
+def add_portal_user(party_doctype, party_name, user):
+    """
+    Background job: add the user to the Portal Users of their party, if missing.
+
+    Args:
+        party_doctype (str): "Customer" or "Supplier".
+        party_name (str): The name of the party.
+        user (str): The user to add.
+
+    Returns:
+        None
+    """
+    if frappe.db.exists("Portal User", {"parent": party_name, "user": user}):
+        return
+
+    doc = frappe.get_doc(party_doctype, party_name)
+    doc.append("portal_users", {"user": user})
+    doc.flags.ignore_permissions = True
+    doc.flags.ignore_mandatory = True
+    doc.save()
+
+
+def set_cart_count(quotation=None, cart_items=None, cart_lines=None):
     """
     Set the cart item count in cookies for guest users or based on the Quotation for logged-in users.
 
     Args:
         quotation (Optional[frappe.model.document.Document]): The Quotation document for logged-in users.
         cart_items (Optional[List[dict]]): The cart items for guest users.
+        cart_lines (Optional[List[dict]]): Pending cart lines of logged-in users, counted instead of the Quotation.
 
     Returns:
         int: The total item count in the cart.
@@ -231,18 +518,29 @@ def set_cart_count(quotation=None, cart_items=None):
 
     if cart_items is None:
         cart_items = []
-    if not quotation and frappe.session.user != "Guest":
+    if not quotation and cart_lines is None and frappe.session.user != "Guest":
         quotation = _get_cart_quotation()
 
-    if frappe.session.user == "Guest":
+    if cart_lines is not None:
+        cart_count = sum(flt(line.get("qty")) for line in cart_lines)
+        total_amount = sum(flt(line.get("qty")) * flt(line.get("rate")) for line in cart_lines)
+
+    elif frappe.session.user == "Guest":
+        cart_items = apply_current_prices(cart_items)
         cart_count = sum(item.get("qty", 0) for item in cart_items)
         total_amount = sum(flt(item.get("qty", 0)) * flt(item.get("price", 0)) for item in cart_items)
 
     else:
         cart_count = cint(quotation.get("total_qty"))
         total_amount = flt(quotation.get("grand_total"))
-
-    default_currency = frappe.db.get_single_value("Global Defaults", "default_currency")
+        checkout_config = get_checkout_config()
+        if quotation.get("items") and checkout_config.tax_template:
+            # the grand total of the order summary, with shipping and taxes
+            total_amount = _get_quotation_totals(
+                quotation, checkout_config.shipping_rule, checkout_config.tax_template
+            )["grand_total"]
+
+    default_currency = get_checkout_config().currency
     total_amount = frappe.utils.fmt_money(total_amount, currency=default_currency)
     if hasattr(frappe.local, "cookie_manager"):
         frappe.local.cookie_manager.set_cookie("cart_count", cstr(cart_count))
@@ -322,7 +620,7 @@ def get_cart_items(quotation=None):
     Returns:
         list: A list of dictionaries containing item details (name, code, quantity, image) for each cart item.
     """
-    default_currency = frappe.db.get_single_value("Global Defaults", "default_currency")
+    default_currency = get_checkout_config().currency
 
     if frappe.session.user != "Guest":
         if not quotation:
@@ -351,9 +649,7 @@ def get_order_details(quotation=None, cart_items=None):
         return calculate_taxes_and_totals(quotation=quotation) if len(quotation.get("items")) > 0 else None
 
     elif frappe.session.user == "Guest":
-        if isinstance(cart_items, str):
-            cart_items = frappe.parse_json(cart_items)
-        return calculate_taxes_and_totals(cart_items=cart_items)
+        return calculate_taxes_and_totals(cart_items=get_guest_cart(cart_items))
 
 
 def get_cart_items_for_logged_in_user(quotation, default_currency):
@@ -371,23 +667,23 @@ def get_cart_items_for_logged_in_user(quotation, default_currency):
     ]
 
 
-def get_cart_items_for_guest_user(default_currency):
+def get_cart_items_for_guest_user(default_currency, cart_items=None):
     """Helper function to get cart items for guest users."""
-    cart_items = frappe.local.request.args.get('cart_items')
-
-    if cart_items:
-        cart_items = json.loads(cart_items)
-    else:
-        cart_items = []
+    if cart_items is None:
+        cart_items = get_guest_cart(frappe.local.request.args.get('cart_items'))
+    cart_items = apply_current_prices(cart_items)
+    items_details = get_item_details([item.get("item_code") for item in cart_items])
 
     modified_cart_items = []
 
     for item in cart_items:
-        item_details = frappe.get_cached_doc("Item", item.get("item_code"))
+        item_details = items_details.get(item.get("item_code"))
+        if not item_details:
+            frappe.throw(_("Item {0} not found").format(item.get("item_code")), frappe.DoesNotExistError)
 
         item_dict = {
             "item_name": item_details.item_name,
-            "item_code": item_details.item_code,
+            "item_code": item_details.name,
             "qty": item.get("qty"),
             "image": item_details.image if item_details.image else '/assets/hopkins/img/no-image-250x250.png',
             "rate": frappe.utils.fmt_money(item.get("price", 0), currency=default_currency),
@@ -404,8 +700,9 @@ def update_cart_qty(item_code, qty, action, cart_items=None, quotation=None):
     """
     Update the quantity of an item in the cart for the guest or logged-in user.
 
-    - For guest users, the cart is updated in cookies.
-    - For logged-in users, the cart is updated in the associated Quotation.
+    - For guest users, the cart is updated in cookies, or server-side when enabled.
+    - For logged-in users, the cart is updated in the associated Quotation, or only recorded
+      when deferred saves are enabled.
 
     Args:
         item_code (str): The code of the item to update.
@@ -418,107 +715,235 @@ def update_cart_qty(item_code, qty, action, cart_items=None, quotation=None):
         list: The updated list of cart items.
     """
     if frappe.session.user == "Guest":
-        if cart_items:
-            cart_items = json.loads(cart_items)
-        else:
-            cart_items = []
-        qty = int(qty)
-        item_found = False
-        for item in cart_items:
-            if item["item_code"] == item_code:
-                item_found = True
-                if action == "add":
-                    item["qty"] += qty
-                elif action == "remove":
-                    item["qty"] -= qty
-                    if item["qty"] < 1:
-                        cart_items.remove(item)
-                elif action == "delete":
-                    cart_items.remove(item)
-                break
-
-        if not item_found and action == "add":
-            cart_items.append({
-                "item_code": item_code,
-                "qty": qty
-            })
-        frappe.local.cookie_manager.set_cookie("cart_items", json.dumps(cart_items))
-    else:
-        empty_card = False
-        if not quotation:
-            quotation = _get_cart_quotation()
+        cart_items = update_guest_cart(
+            lambda items: apply_guest_cart_change(items, item_code, action, qty), cart_items
+        )
+        set_cart_count(cart_items=cart_items)
+        return cart_items
 
-        if not quotation:
-            return []
-
-        existing_item = next((item for item in quotation.items if item.item_code == item_code), None)
-
-        if existing_item:
-            if action == "add":
-                existing_item.qty += int(qty)
-            elif action == "remove":
-                existing_item.qty -= qty
-                if existing_item.qty < 1:
-                    quotation.items.remove(existing_item)
-            elif action == "delete":
-                quotation.items.remove(existing_item)
-        else:
-            if action == "add":
-                quotation.append("items", {
-                    "item_code": item_code,
-                    "qty": int(qty)
-                })
+    if quotation and not isinstance(quotation, str):
+        quotation = quotation.name
 
-        if len(quotation.get('items')) == 0:
-            quotation.delete()
-        else:
-            quotation.save(ignore_version=True)
-            frappe.db.commit()
-            cart_items = quotation.items
+    operations = [{"item_code": item_code, "action": action, "qty": flt(qty)}]
+    if is_deferred_save_enabled():
+        pending = _update_pending_cart(operations, quotation_name=quotation)
+        if pending:
+            set_cart_count(cart_lines=get_pending_lines(pending))
+            return get_pending_lines(pending)
+
+    quotation = _update_cart_quotation(operations, quotation_name=quotation)
+    frappe.db.commit()
 
-    set_cart_count(cart_items=cart_items)
-    return cart_items
+    if not quotation:
+        set_cart_count(cart_lines=[])
+        return []
+
+    set_cart_count(quotation=quotation)
+    return quotation.items
+
+
+CART_ACTIONS = ("add", "remove", "delete")
+
+
+@frappe.whitelist(allow_guest=True)
+def update_cart_items(operations, cart_items=None):
+    """
+    Apply many cart changes in one call, with a single save of the cart.
+
+    The operations are validated first and then applied in order, to the guest cart
+    or to the cart Quotation, so either all of them are saved or none is.
+
+    Args:
+        operations (str or list): The changes, dicts with item_code, qty and action
+                                  ("add", "remove" or "delete", defaults to "add").
+        cart_items (Optional[List[dict]]): The cart items for guest users without a server-side cart.
+
+    Returns:
+        dict: items (as get_cart_items returns them), count and totals of the updated cart.
+    """
+    operations = _parse_cart_operations(operations)
+    default_currency = get_checkout_config().currency
+
+    if frappe.session.user == "Guest":
+        item_prices = get_item_prices(
+            get_default_price_list(), [op["item_code"] for op in operations if op["action"] == "add"]
+        )
+
+        def apply(items):
+            for op in operations:
+                apply_guest_cart_change(
+                    items, op["item_code"], op["action"], op["qty"], price=item_prices.get(op["item_code"], 0)
+                )
+
+        cart_items = update_guest_cart(apply, cart_items)
+
+        return {
+            "items": get_cart_items_for_guest_user(default_currency, cart_items),
+            "count": set_cart_count(cart_items=cart_items),
+            "totals": calculate_taxes_and_totals(cart_items=cart_items) if cart_items else None,
+        }
+
+    quotation = _update_cart_quotation(operations)
+    if not quotation:
+        set_cart_count(cart_lines=[])
+        return {"items": [], "count": 0, "totals": None}
+
+    return {
+        "items": get_cart_items_for_logged_in_user(quotation, default_currency),
+        "count": set_cart_count(quotation=quotation),
+        "totals": calculate_taxes_and_totals(quotation=quotation),
+    }
+
+
+def _parse_cart_operations(operations):
+    if isinstance(operations, str):
+        operations = json.loads(operations)
+
+    if not isinstance(operations, list):
+        frappe.throw(_("Cart operations must be a list"))
+
+    parsed = []
+    for op in operations:
+        action = op.get("action") or "add"
+        if action not in CART_ACTIONS:
+            frappe.throw(_("Invalid cart action {0}").format(action))
+
+        if not op.get("item_code"):
+            frappe.throw(_("Item code is required for every cart operation"))
+
+        qty = flt(op.get("qty"))
+        if qty < 0:
+            frappe.throw(_("Quantity cannot be negative for item {0}").format(op["item_code"]))
+
+        parsed.append({"item_code": op["item_code"], "qty": qty, "action": action})
+
+    return parsed
+
+
+# Attempts at saving the cart Quotation while concurrent requests keep changing it.
+CART_SAVE_ATTEMPTS = 5
+
+CART_SAVEPOINT = "cart_quotation_update"
+
+
+def _update_cart_quotation(operations, quotation_name=None):
+    """
+    Apply cart changes to the cart Quotation and save it once.
+
+    Changes are deltas (add or remove a quantity, delete a line) rather than new
+    states. The Quotation and its items are read with locking reads, see
+    _get_quotation_for_update, so concurrent cart saves run one after the other and
+    each applies its deltas to the quantities the previous one committed. Concurrent
+    clicks add up instead of overwriting each other. Should a save still conflict
+    with a writer that did not lock the Quotation, it fails with a
+    TimestampMismatchError; only that attempt is rolled back, to a savepoint, and
+    the deltas are applied again to the newer Quotation.
+
+    With deferred saves the changes go through the pending cart, which is then
+    folded, so clicks recorded while this request runs are not folded over them.
+
+    Args:
+        operations (list): Dicts with item_code, action, qty and optionally
+                           additional_notes and update_notes.
+        quotation_name (Optional[str]): The Quotation to change. Defaults to the cart Quotation of the user.
+
+    Returns:
+        Optional[frappe.model.document.Document]: The saved Quotation, or None if it was emptied and deleted.
+    """
+    if is_deferred_save_enabled() and _update_pending_cart(operations, quotation_name):
+        operations, quotation_name = [], None
+
+    for attempt in range(CART_SAVE_ATTEMPTS):
+        # a conflict only undoes this attempt, not what the request did before it
+        frappe.db.savepoint(CART_SAVEPOINT)
+        try:
+            if quotation_name:
+                quotation = _get_quotation_for_update(quotation_name)
+            else:
+                quotation = _get_cart_quotation(fold_pending=True)
+                quotation.flags.ignore_permissions = True
+
+            for op in operations:
+                _apply_quotation_change(quotation, **op)
+
+            quotation.payment_schedule = []
+            if quotation.items:
+                quotation.save(ignore_version=True)
+            else:
+                if not quotation.is_new():
+                    quotation.delete(ignore_permissions=quotation.flags.ignore_permissions)
+                quotation = None
+
+            return quotation
+
+        except frappe.TimestampMismatchError:
+            if attempt == CART_SAVE_ATTEMPTS - 1:
+                raise
+
+            # the other request has committed, start over from the latest Quotation
+            frappe.db.rollback(save_point=CART_SAVEPOINT)
+            frappe.clear_messages()
+
+
+def _apply_quotation_change(quotation, item_code, action, qty, additional_notes=None, update_notes=False):
+    """Apply one change to the items of the cart Quotation, the same way update_cart_qty does."""
+    existing_item = next((item for item in quotation.items if item.item_code == item_code), None)
+
+    if existing_item:
+        if action == "add":
+            existing_item.qty += qty
+            if update_notes:
+                existing_item.additional_notes = additional_notes
+        elif action == "remove":
+            existing_item.qty -= qty
+            if existing_item.qty < 1:
+                quotation.items.remove(existing_item)
+        elif action == "delete":
+            quotation.items.remove(existing_item)
+
+    elif action == "add":
+        quotation.append(
+            "items",
+            {"doctype": "Quotation Item", "item_code": item_code, "qty": qty, "additional_notes": additional_notes},
+        )
 
 
 @frappe.whitelist()
-def get_shipping_addresses(party=None):
+def get_shipping_addresses(party=None, limit_start=0, limit_page_length=0):
     """
     Retrieve the list of shipping addresses for the given party.
 
     Args:
         party (Optional[frappe.model.document.Document]): The party for whom the shipping addresses are fetched. Defaults to the current user's party.
+        limit_start (int): The offset of the page.
+        limit_page_length (int): The size of the page, 0 for all addresses.
 
     Returns:
         list: A list of dictionaries containing the name, title, and display of each shipping address.
     """
-    if not party:
-        party = get_party()
-    addresses = get_address_docs(party=party)
-    return [
-        {
-            "name": address.name,
-            "title": address.address_title,
-            "display": address.display,
-        }
-        for address in addresses
-        if address.address_type == "Shipping"
-    ]
+    return _get_addresses_of_type("Shipping", party, limit_start, limit_page_length)
 
 
 @frappe.whitelist()
-def get_billing_addresses(party=None):
+def get_billing_addresses(party=None, limit_start=0, limit_page_length=0):
     """
     Retrieve the list of billing addresses for the given party.
 
     Args:
         party (Optional[frappe.model.document.Document]): The party for whom the billing addresses are fetched. Defaults to the current user's party.
+        limit_start (int): The offset of the page.
+        limit_page_length (int): The size of the page, 0 for all addresses.
 
     Returns:
         list: A list of dictionaries containing the name, title, and display of each billing address.
     """
-    if not party:
-        party = get_party()
-    addresses = get_address_docs(party=party)
+    return _get_addresses_of_type("Billing", party, limit_start, limit_page_length)
+
+
+def _get_addresses_of_type(address_type, party=None, limit_start=0, limit_page_length=0):
+    addresses = get_address_docs(
+        limit_start=limit_start, limit_page_length=limit_page_length, party=party, address_type=address_type
+    )
     return [
         {
             "name": address.name,
@@ -526,7 +951,6 @@ def get_billing_addresses(party=None):
             "display": address.display,
         }
         for address in addresses
-        if address.address_type == "Billing"
     ]
 
 
@@ -537,6 +961,7 @@ def get_address_docs(
     limit_start=0,
     limit_page_length=20,
     party=None,
+    address_type=None,
 ):
     """
     Retrieve address documents associated with the given party.
@@ -546,11 +971,12 @@ def get_address_docs(
         txt (Optional[str]): Search term for filtering address fields.
         filters (Optional[dict]): Additional filters to apply to the address query.
         limit_start (int): The starting index for the address query.
-        limit_page_length (int): The number of addresses to return.
+        limit_page_length (int): The number of addresses to return, 0 for all.
         party (Optional[frappe.model.document.Document]): The party for which to retrieve the addresses. Defaults to the current user's party.
+        address_type (Optional[str]): Only return addresses of this type.
 
     Returns:
-        list: A list of Address documents associated with the party.
+        list: Address rows (frappe._dict with all Address fields and `display`) associated with the party.
     """
     if not party:
         party = get_party()
@@ -558,23 +984,15 @@ def get_address_docs(
     if not party:
         return []
 
-    address_names = frappe.db.get_all(
-        "Dynamic Link",
-        fields=("parent"),
-        filters=dict(
-            parenttype="Address", link_doctype=party.doctype, link_name=party.name
-        ),
+    return get_party_addresses(
+        party,
+        address_type=address_type,
+        txt=txt,
+        filters=filters,
+        limit_start=cint(limit_start),
+        limit_page_length=cint(limit_page_length),
     )
 
-    out = []
-
-    for a in address_names:
-        address = frappe.get_doc("Address", a.parent)
-        address.display = get_address_display(address.as_dict())
-        out.append(address)
-
-    return out
-
 
 @frappe.whitelist()
 def add_new_address(doc):
@@ -610,8 +1028,9 @@ def update_cart_address(address_type, address_name, quotation=None):
     """
     if not quotation:
         quotation = _get_cart_quotation()
-    address_doc = frappe.get_doc("Address", address_name).as_dict()
-    address_display = get_address_display(address_doc)
+    # the party of the quotation, a guest checkout has no party of its own
+    party = frappe._dict(doctype=quotation.quotation_to, name=quotation.party_name)
+    address_display = get_party_address(party, address_name).display
 
     if address_type.lower() == "billing":
         quotation.customer_address = address_name
@@ -619,22 +1038,14 @@ def update_cart_address(address_type, address_name, quotation=None):
         quotation.shipping_address_name = (
             quotation.shipping_address_name or address_name
         )
-        address_doc = next(
-            (doc for doc in get_billing_addresses() if doc["name"] == address_name),
-            None,
-        )
     elif address_type.lower() == "shipping":
         quotation.shipping_address_name = address_name
         quotation.shipping_address = address_display
         quotation.customer_address = quotation.customer_address or address_name
-        address_doc = next(
-            (doc for doc in get_shipping_addresses() if doc["name"] == address_name),
-            None,
-        )
 
 
 @frappe.whitelist(allow_guest=True)
-def place_order(doc=None, cart_items=None):
+def place_order(doc=None, cart_items=None, idempotency_key=None):
     """
     Place an order by converting a cart into a sales order.
 
@@ -643,13 +1054,209 @@ def place_order(doc=None, cart_items=None):
     - The function calculates taxes, applies shipping rules, and submits the quotation.
     - It then creates and submits a sales order, deleting the cart count cookie.
 
+    See start_checkout for the same in a background job.
+
     Args:
         doc (Optional[str]): The address and customer details as JSON for guest users.
         cart_items (Optional[str]): The cart items as JSON for guest users.
+        idempotency_key (Optional[str]): A key generated by the client for this submission.
+                                         Repeated submissions with the key return the first order.
 
     Returns:
         str: The name of the created sales order.
     """
+    def place():
+        items = get_guest_cart(cart_items) if frappe.session.user == "Guest" and doc else cart_items
+        return _place_order(doc, items).name
+
+    sales_order_name = run_once(idempotency_key, place)
+
+    if hasattr(frappe.local, "cookie_manager"):
+        frappe.local.cookie_manager.delete_cookie("cart_count")
+
+    return sales_order_name
+
+
+@frappe.whitelist(allow_guest=True)
+def start_checkout(doc=None, cart_items=None, idempotency_key=None):
+    """
+    Validate the cart and queue the order to be placed in the background.
+
+    The cart is checked and taken over by the checkout right away: a guest's cart is
+    emptied, and the lines and address of a logged-in user's cart are checked and stored
+    with the checkout. The Customer, Quotation and Sales Order are created by a background
+    job. Poll get_checkout_status with the returned token for the result.
+
+    Args:
+        doc (Optional[str]): The address and customer details as JSON for guest users.
+        cart_items (Optional[str]): The cart items as JSON for guest users.
+        idempotency_key (Optional[str]): A key generated by the client for this submission.
+                                         Repeated submissions with the key return the first checkout.
+
+    Returns:
+        dict: token and status of the checkout.
+    """
+    return run_once(idempotency_key, lambda: _start_checkout(doc, cart_items))
+
+
+def _start_checkout(doc=None, cart_items=None):
+    if frappe.session.user == "Guest":
+        if not doc:
+            frappe.throw(_("Customer details are required to place an order"))
+
+        doc = frappe.parse_json(doc)
+        for fieldname in ("full_name", "email_id", "phone"):
+            if not doc.get(fieldname):
+                frappe.throw(_("{0} is required to place an order").format(frappe.unscrub(fieldname)))
+
+        cart_items = get_guest_cart(cart_items)
+        if not cart_items:
+            frappe.throw(_("Your cart is empty"))
+
+        token = new_checkout(doc=doc, cart_items=cart_items)
+        clear_guest_cart()
+        set_cart_count(cart_items=[])
+
+    else:
+        quotation = _get_cart_quotation(fold_pending=True)
+        if quotation.is_new() or not quotation.items:
+            frappe.throw(_("Your cart is empty"))
+
+        # without an address on the Quotation, submitting it fills the party's default one
+        if not (
+            quotation.shipping_address_name
+            or quotation.customer_address
+            or frappe.db.exists(
+                "Dynamic Link",
+                {"parenttype": "Address", "link_doctype": quotation.quotation_to, "link_name": quotation.party_name},
+            )
+        ):
+            frappe.throw(_("Set Shipping Address or Billing Address"))
+
+        # the order is placed with these lines, cart changes made before the job runs are not ordered
+        lines = {
+            item.item_code: {"qty": item.qty, "additional_notes": item.additional_notes} for item in quotation.items
+        }
+        token = new_checkout(quotation=quotation.name, lines=lines)
+
+    frappe.enqueue(
+        "builder_ecommerce.cart.process_checkout",
+        queue="short",
+        job_id=f"checkout::{token}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        token=token,
+    )
+
+    return {"token": token, "status": QUEUED}
+
+
+def process_checkout(token):
+    """Background job: place the order of a checkout started by start_checkout. Runs once per token."""
+    checkout = get_checkout(token)
+    if not checkout or checkout["status"] != QUEUED:
+        return
+
+    update_checkout(token, status=PROCESSING)
+
+    try:
+        quotation = None
+        if checkout.get("quotation"):
+            quotation = _get_quotation_for_update(checkout["quotation"])
+            if checkout.get("lines"):
+                _set_quotation_lines(quotation, checkout["lines"])
+
+        sales_order = _place_order(checkout.get("doc"), checkout.get("cart_items"), quotation=quotation)
+        frappe.db.commit()
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(title=f"Checkout {token} failed")
+        update_checkout(token, status=FAILED, error=_get_error_message(e))
+        return
+
+    default_currency = get_checkout_config().currency
+    update_checkout(
+        token,
+        status=COMPLETED,
+        sales_order=sales_order.name,
+        items=[
+            {
+                "item_name": item.item_name,
+                "item_code": item.item_code,
+                "qty": item.qty,
+                "image": item.image,
+                "amount": frappe.utils.fmt_money(item.amount, currency=default_currency),
+            }
+            for item in sales_order.items
+        ],
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+def get_checkout_status(token, cart_items=None):
+    """
+    Return the status of a checkout started by start_checkout.
+
+    A guest whose checkout failed gets the lines of the checkout back in their cart.
+
+    Args:
+        token (str): The order token returned by start_checkout.
+        cart_items (Optional[str]): The cart items as JSON for guest users without a server-side cart.
+
+    Returns:
+        dict: status ("queued", "processing", "completed" or "failed"), and once completed
+              name (the Sales Order) and items, or once failed the error message.
+    """
+    checkout = get_checkout(token)
+    if not checkout or checkout["user"] != frappe.session.user:
+        frappe.throw(_("Checkout not found"), frappe.DoesNotExistError)
+
+    if checkout["status"] == FAILED and checkout.get("cart_items") and not checkout.get("cart_restored"):
+        update_checkout(token, cart_restored=1)
+
+        def restore(items):
+            for line in checkout["cart_items"]:
+                apply_guest_cart_change(
+                    items, line["item_code"], "add", line.get("qty", 1), price=line.get("price"), notes=line.get("notes")
+                )
+
+        set_cart_count(cart_items=update_guest_cart(restore, cart_items))
+
+    elif checkout["status"] == COMPLETED and hasattr(frappe.local, "cookie_manager"):
+        frappe.local.cookie_manager.delete_cookie("cart_count")
+
+    return {
+        "status": checkout["status"],
+        "name": checkout.get("sales_order"),
+        "items": checkout.get("items"),
+        "error": checkout.get("error"),
+    }
+
+
+def _get_error_message(exception):
+    """The last message shown to the user by the failed checkout, or the exception itself."""
+    for message in reversed(frappe.local.message_log or []):
+        message = frappe.parse_json(message) if isinstance(message, str) else message
+        if message.get("message"):
+            return frappe.utils.strip_html(message["message"])
+
+    return cstr(exception) or _("The order could not be placed")
+
+
+def _place_order(doc=None, cart_items=None, quotation=None):
+    """
+    Create the party of a guest if needed, then submit the cart Quotation and the Sales Order made from it.
+
+    Args:
+        doc (Optional[str | dict]): The address and customer details for guest users.
+        cart_items (Optional[list]): The cart lines of a guest.
+        quotation (Optional[frappe.model.document.Document]): The cart Quotation of a logged-in user.
+                                                              Defaults to the current cart quotation.
+
+    Returns:
+        frappe.model.document.Document: The submitted Sales Order.
+    """
     if frappe.session.user == "Guest" and doc:
         address = add_new_address(doc)
         doc = frappe.parse_json(doc)
@@ -659,21 +1266,24 @@ def place_order(doc=None, cart_items=None):
             "customer_email_address": doc.email_id
         }
 
-        party = create_party(doc=customer)
+        # repeat guest buyers keep their Customer and Contact
+        party, contact = find_guest_party(doc.email_id, doc.phone)
+        if not party:
+            party = create_party(doc=customer)
+            contact = create_contact(doc, party.name) if party else None
+
         if party:
-            contact = create_contact(doc, party.name)
             quotation = _get_cart_quotation(party=party, contact=contact)
             if address:
                 update_address_with_customer(address.name, party.name)
                 update_cart_address(address_type=address.address_type, address_name=address.name,
                                     quotation=quotation)
 
-            cart_items = frappe.parse_json(cart_items) if cart_items else []
             if cart_items:
                 add_items_to_quotation(quotation, cart_items)
 
     else:
-        quotation = _get_cart_quotation()
+        quotation = quotation or _get_cart_quotation(fold_pending=True)
         party = get_party()
 
     if not quotation:
@@ -682,6 +1292,11 @@ def place_order(doc=None, cart_items=None):
     set_price_list_and_rate(quotation)
     quotation.run_method("calculate_taxes_and_totals")
     set_taxes(quotation)
+
+    shipping_rule = get_checkout_config().shipping_rule
+    if shipping_rule:
+        # the rule the order summary was computed with, see _get_quotation_totals
+        quotation.shipping_rule = shipping_rule.name
     _apply_shipping_rule(party, quotation)
 
     quotation.flags.ignore_permissions = True
@@ -705,10 +1320,7 @@ def place_order(doc=None, cart_items=None):
     sales_order.insert()
     sales_order.submit()
 
-    if hasattr(frappe.local, "cookie_manager"):
-        frappe.local.cookie_manager.delete_cookie("cart_count")
-
-    return sales_order.name
+    return sales_order
 
 
 def create_party(doc):
@@ -802,7 +1414,7 @@ def add_items_to_quotation(quotation, cart_items):
         )
     quotation.run_method("set_missing_values")
     quotation.save(ignore_permissions=True, ignore_version=True)
-    frappe.local.cookie_manager.set_cookie("cart_items", [])
+    clear_guest_cart()
     set_cart_count(cart_items=[])
 
 
@@ -959,111 +1571,45 @@ def _apply_shipping_rule(party=None, quotation=None):
 
 
 def calculate_taxes_and_totals(quotation=None, cart_items=None):
-    total_weight = total_price = 0
-    total_excluded_tax = total_included_tax = 0
     order_summary = []
-    default_currency = frappe.db.get_single_value("Global Defaults", "default_currency")
-    default_tax_template = frappe.get_cached_doc('Sales Taxes and Charges Template', {'is_default': 1})
+    checkout_config = get_checkout_config()
+    default_currency = checkout_config.currency
+    default_tax_template = checkout_config.tax_template
+    shipping_rule = checkout_config.shipping_rule
 
-    shipping_rule_data = frappe.get_all(
-        "Shipping Rule",
-        filters={
-            "shipping_rule_type": "Selling",
-            "calculate_based_on": "Net Weight",
-            "disabled": 0
-        },
-        fields=["name"],
-        limit=1
-    )
-
-    shipping_rule = None
-    if shipping_rule_data:
-        shipping_rule = frappe.get_cached_doc("Shipping Rule", shipping_rule_data[0].name)
+    if not default_tax_template:
+        frappe.throw(_("No default Sales Taxes and Charges Template found"), frappe.DoesNotExistError)
 
     if frappe.session.user == "Guest":
         if not cart_items:
-            cart_items = []
-
-        for item in cart_items:
-            item_code = item.get("item_code")
-            qty = item.get("qty", 1)
-            price = item.get("price", 0)
-
-            weight_per_unit = frappe.db.get_value("Item", item_code, "weight_per_unit") or 0
-            total_weight += flt(weight_per_unit) * qty
-            total_price += flt(price) * qty
-
-        # Apply shipping rule for guest
-        if shipping_rule:
-            for condition in shipping_rule.conditions:
-                if condition.from_value <= total_weight <= condition.to_value:
-                    shipping_charge = condition.shipping_amount
-                    total_excluded_tax += shipping_charge
-                    order_summary.append({
-                        "description": shipping_rule.name,
-                        "tax_amount": frappe.utils.fmt_money(shipping_charge, currency=default_currency),
-                        "included_in_price": 0
-                    })
-                    break
-
-        # Apply tax template
-        for tax_row in default_tax_template.taxes:
-            if tax_row.charge_type == "On Net Total":
-                tax_rate = flt(tax_row.rate) / 100
-
-                if tax_row.included_in_print_rate:
-                    included_tax = total_price - (total_price / (1 + tax_rate))
-                    total_included_tax += included_tax
-                else:
-                    excluded_tax = total_price * tax_rate
-                    total_excluded_tax += excluded_tax
-
-                order_summary.append({
-                    "description": tax_row.description,
-                    "tax_amount": frappe.utils.fmt_money(
-                        included_tax if tax_row.included_in_print_rate else excluded_tax,
-                        currency=default_currency
-                    ),
-                    "included_in_price": tax_row.included_in_print_rate
-                })
-
-        grand_total = total_price + total_excluded_tax
+            cart_items = get_guest_cart()
 
-    else:
-        if not quotation:
-            quotation = _get_cart_quotation()
+        totals = get_guest_totals([apply_current_prices(cart_items)], checkout_config)[0]
 
-        quotation.set("taxes", [])
+        total_price = totals["total_price"]
+        grand_total = totals["grand_total"]
 
-        # Apply shipping rule if available
-        if shipping_rule:
-            quotation.shipping_rule = shipping_rule.name
-            quotation.run_method("apply_shipping_rule")
+        for tax_row in totals["taxes"]:
+            order_summary.append({
+                "description": tax_row["description"],
+                "tax_amount": frappe.utils.fmt_money(tax_row["tax_amount"], currency=default_currency),
+                "included_in_price": tax_row["included_in_price"]
+            })
 
-        # Always apply tax template
-        for tax_row in default_tax_template.taxes:
-            tax_row_dict = {
-                "charge_type": tax_row.charge_type,
-                "account_head": tax_row.account_head,
-                "rate": tax_row.rate,
-                "description": tax_row.description,
-                "included_in_print_rate": tax_row.included_in_print_rate,
-                "tax_amount": tax_row.tax_amount,
-            }
-            quotation.append("taxes", tax_row_dict)
+    else:
+        if not quotation:
+            quotation = _get_cart_quotation()
 
-        quotation.run_method("calculate_taxes_and_totals")
-        quotation.save(ignore_permissions=True, ignore_version=True)
-        frappe.db.commit()
+        totals = _get_quotation_totals(quotation, shipping_rule, default_tax_template)
 
-        total_price = flt(quotation.get("total"))
-        grand_total = flt(quotation.get("grand_total"))
+        total_price = totals["total"]
+        grand_total = totals["grand_total"]
 
-        for tax_row in quotation.get('taxes'):
+        for tax_row in totals["taxes"]:
             order_summary.append({
-                "description": tax_row.description,
-                "tax_amount": frappe.utils.fmt_money(tax_row.base_tax_amount, currency=default_currency),
-                "included_in_price": tax_row.included_in_print_rate
+                "description": tax_row["description"],
+                "tax_amount": frappe.utils.fmt_money(tax_row["base_tax_amount"], currency=default_currency),
+                "included_in_price": tax_row["included_in_print_rate"]
             })
 
     return {
@@ -1072,3 +1618,87 @@ def calculate_taxes_and_totals(quotation=None, cart_items=None):
         "order_summary": order_summary
     }
 
+
+
+# Order summaries of logged-in carts, keyed by a hash of everything they depend on.
+QUOTATION_TOTALS_CACHE_TTL = 10 * 60
+
+
+def _get_quotation_totals(quotation, shipping_rule=None, tax_template=None):
+    """
+    Compute the totals of a cart Quotation with the shipping rule and tax template applied,
+    without changing or saving the Quotation.
+
+    Results are cached by a hash of the cart contents, addresses, shipping rule and tax template.
+
+    Args:
+        quotation (frappe.model.document.Document): The cart Quotation.
+        shipping_rule (Optional[frappe._dict]): The Shipping Rule to apply, from get_checkout_config.
+        tax_template (frappe._dict): The Sales Taxes and Charges Template to apply, from get_checkout_config.
+
+    Returns:
+        dict: total, grand_total and taxes (description, base_tax_amount, included_in_print_rate).
+    """
+    cache_key = "quotation_totals::" + _get_quotation_content_hash(quotation, shipping_rule, tax_template)
+    totals = frappe.cache().get_value(cache_key)
+    if totals is not None:
+        return totals
+
+    # work on a detached copy, the cart Quotation itself stays untouched
+    doc = frappe.get_doc(quotation.as_dict())
+    doc.set("taxes", [])
+
+    # Apply shipping rule if available
+    if shipping_rule:
+        doc.shipping_rule = shipping_rule.name
+        doc.run_method("apply_shipping_rule")
+
+    # Always apply tax template
+    for tax_row in tax_template.taxes:
+        tax_row_dict = {
+            "charge_type": tax_row.charge_type,
+            "account_head": tax_row.account_head,
+            "rate": tax_row.rate,
+            "description": tax_row.description,
+            "included_in_print_rate": tax_row.included_in_print_rate,
+            "tax_amount": tax_row.tax_amount,
+        }
+        doc.append("taxes", tax_row_dict)
+
+    doc.run_method("calculate_taxes_and_totals")
+
+    totals = {
+        "total": flt(doc.get("total")),
+        "grand_total": flt(doc.get("grand_total")),
+        "taxes": [
+            {
+                "description": tax_row.description,
+                "base_tax_amount": tax_row.base_tax_amount,
+                "included_in_print_rate": tax_row.included_in_print_rate,
+            }
+            for tax_row in doc.get("taxes")
+        ],
+    }
+
+    frappe.cache().set_value(cache_key, totals, expires_in_sec=QUOTATION_TOTALS_CACHE_TTL)
+    return totals
+
+
+def _get_quotation_content_hash(quotation, shipping_rule=None, tax_template=None):
+    content = {
+        "company": quotation.company,
+        "currency": quotation.currency,
+        "conversion_rate": quotation.conversion_rate,
+        "selling_price_list": quotation.selling_price_list,
+        "customer_address": quotation.customer_address,
+        "shipping_address_name": quotation.shipping_address_name,
+        "discount": [quotation.apply_discount_on, quotation.additional_discount_percentage, quotation.discount_amount],
+        "items": [
+            [item.item_code, item.qty, item.rate, item.price_list_rate, item.discount_percentage, item.item_tax_template]
+            for item in quotation.get("items")
+        ],
+        "shipping_rule": shipping_rule and [shipping_rule.name, str(shipping_rule.modified)],
+        "tax_template": tax_template and [tax_template.name, str(tax_template.modified)],
+    }
+
+    return hashlib.sha1(frappe.as_json(content).encode()).hexdigest()
@@ -0,0 +1,52 @@
+import json
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("warm-variant-caches")
+@click.option("--batch-size", type=int, default=500, help="Templates written per Redis pipeline")
+@pass_context
+def warm_variant_caches(context, batch_size):
+	"Build the variant selector cache of every template with variants"
+	import frappe
+
+	from builder_ecommerce.ecommerce.variant_selector.warmup import warm_variant_caches
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		report = warm_variant_caches(batch_size=batch_size)
+		if report is None:
+			click.secho("Another warmup is already running", fg="yellow")
+		else:
+			click.echo(json.dumps(report, indent=1))
+	finally:
+		frappe.destroy()
+
+
+@click.command("merge-guest-customers")
+@click.option("--dry-run", is_flag=True, default=False, help="Only list the duplicates that would be merged")
+@pass_context
+def merge_guest_customers(context, dry_run):
+	"Merge the Customers and Contacts created more than once by guest checkouts of the same buyer"
+	import frappe
+
+	from builder_ecommerce.ecommerce.shopping_cart.guest_customers import merge_duplicate_customers
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		merged = merge_duplicate_customers(dry_run=dry_run)
+		click.echo(json.dumps(merged, indent=1))
+		click.secho(
+			f"{'Would merge' if dry_run else 'Merged'} duplicates of {len(merged)} buyers",
+			fg="yellow" if dry_run else "green",
+		)
+	finally:
+		frappe.destroy()
+
+
+commands = [warm_variant_caches, merge_guest_customers]
@@ -0,0 +1,10 @@
+from redis.exceptions import LockError
+
+
+def release_lock(lock):
+	"""Release a Redis lock taken with `frappe.cache().lock`, if it is still ours."""
+	try:
+		lock.release()
+	except LockError:
+		# the lock expired while its holder worked, another one may own it now
+		pass
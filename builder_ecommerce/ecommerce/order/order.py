@@ -1,4 +1,7 @@
 import frappe
+from frappe import _
+
+from builder_ecommerce.ecommerce.shopping_cart.item_prices import get_item_prices
 
 
 @frappe.whitelist()
@@ -21,6 +24,14 @@ def cancel_order(order_id):
 
 @frappe.whitelist()
 def reorder(order_id):
+    return _reorder(order_id)
+
+
+def _reorder(order_id, latest_prices=None):
+    """Reorder a canceled Sales Order at the latest prices.
+
+    `latest_prices` maps (price_list, item_code) to the rate, as resolved for a whole batch
+    by get_latest_prices; without it the prices of this order are looked up."""
     try:
         sales_order = frappe.get_doc("Sales Order", order_id)
 
@@ -32,10 +43,17 @@ def reorder(order_id):
         new_sales_order.status = "Draft"
         new_sales_order.amended_from = sales_order.name
 
+        if latest_prices is None:
+            price_list = sales_order.selling_price_list
+            latest_prices = {
+                (price_list, item_code): rate
+                for item_code, rate in get_item_prices(
+                    price_list, [item.item_code for item in new_sales_order.items]
+                ).items()
+            }
+
         for item in new_sales_order.items:
-            latest_price = frappe.get_value("Item Price",
-                                            {"item_code": item.item_code, "price_list": sales_order.selling_price_list},
-                                            "price_list_rate")
+            latest_price = latest_prices.get((sales_order.selling_price_list, item.item_code))
             if latest_price:
                 item.rate = latest_price
                 item.amount = item.qty * latest_price
@@ -44,9 +62,145 @@ def reorder(order_id):
         new_sales_order.submit()
 
         return {"status": "success",
+                "sales_order": new_sales_order.name,
                 "message": f"New Sales Order {new_sales_order.name} has been created and submitted from canceled order {order_id}, with updated prices."}
 
     except frappe.DoesNotExistError:
         return {"status": "error", "message": "Sales Order not found"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+
+def get_latest_prices(order_ids):
+    """The current rates of every item of the orders, in their price lists: (price_list, item_code) => rate."""
+    items_by_price_list = {}
+    for row in frappe.db.sql(
+        """
+        SELECT DISTINCT so.selling_price_list, soi.item_code
+        FROM `tabSales Order Item` soi
+        INNER JOIN `tabSales Order` so ON so.name = soi.parent
+        WHERE soi.parenttype = 'Sales Order' AND so.name IN %(order_ids)s
+        """,
+        {"order_ids": order_ids},
+    ):
+        items_by_price_list.setdefault(row[0], []).append(row[1])
+
+    latest_prices = {}
+    for price_list, item_codes in items_by_price_list.items():
+        if not price_list:
+            continue
+        for item_code, rate in get_item_prices(price_list, item_codes).items():
+            latest_prices[(price_list, item_code)] = rate
+
+    return latest_prices
+
+
+# job id => progress and per-order results of a bulk cancel or reorder
+BULK_JOB_KEY = "order_bulk_job::{job_id}"
+
+# Seconds the results of a bulk job are kept for status polls.
+BULK_JOB_EXPIRY = 24 * 60 * 60
+
+MAX_BULK_ORDERS = 200
+
+
+@frappe.whitelist()
+def bulk_cancel_orders(order_ids):
+    """Cancel many Sales Orders in a background job. Poll get_bulk_order_job for progress and results."""
+    return _start_bulk_job("cancel", order_ids)
+
+
+@frappe.whitelist()
+def bulk_reorder(order_ids):
+    """Reorder many canceled Sales Orders in a background job. Poll get_bulk_order_job for progress and results."""
+    return _start_bulk_job("reorder", order_ids)
+
+
+@frappe.whitelist()
+def get_bulk_order_job(job_id):
+    """
+    Return the progress of a bulk cancel or reorder.
+
+    Returns:
+        dict: action, status ("queued", "running" or "completed"), total, processed and
+              results, one {"order_id", "status", "message"} per processed order.
+    """
+    job = frappe.cache().get_value(BULK_JOB_KEY.format(job_id=job_id), expires=True)
+    if not job or job["user"] != frappe.session.user:
+        frappe.throw(_("Bulk order job not found"), frappe.DoesNotExistError)
+
+    return job
+
+
+def _start_bulk_job(action, order_ids):
+    order_ids = list(dict.fromkeys(frappe.parse_json(order_ids) or []))
+    if not order_ids:
+        frappe.throw(_("Select at least one order"))
+    if len(order_ids) > MAX_BULK_ORDERS:
+        frappe.throw(_("At most {0} orders can be processed at once").format(MAX_BULK_ORDERS))
+
+    job_id = frappe.generate_hash(length=20)
+    _save_bulk_job(
+        job_id,
+        {
+            "user": frappe.session.user,
+            "action": action,
+            "order_ids": order_ids,
+            "status": "queued",
+            "total": len(order_ids),
+            "processed": 0,
+            "results": [],
+        },
+    )
+
+    frappe.enqueue(
+        "builder_ecommerce.ecommerce.order.order.process_bulk_job",
+        queue="long",
+        job_id=f"order_bulk_job::{job_id}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        bulk_job_id=job_id,
+    )
+
+    return {"job_id": job_id, "status": "queued", "total": len(order_ids)}
+
+
+def process_bulk_job(bulk_job_id):
+    """Background job: cancel or reorder the orders of a bulk job one by one, committing and
+    reporting progress after each. Runs as the user who started it, so their permissions apply."""
+    job = frappe.cache().get_value(BULK_JOB_KEY.format(job_id=bulk_job_id), expires=True)
+    if not job or job["status"] != "queued":
+        return
+
+    job["status"] = "running"
+    _save_bulk_job(bulk_job_id, job)
+
+    # one pass over the prices of every line of every order
+    latest_prices = get_latest_prices(job["order_ids"]) if job["action"] == "reorder" else None
+
+    for order_id in job["order_ids"]:
+        if job["action"] == "cancel":
+            result = cancel_order(order_id)
+        else:
+            result = _reorder(order_id, latest_prices)
+
+        if result["status"] == "success":
+            frappe.db.commit()
+        else:
+            frappe.db.rollback()
+
+        job["results"].append(dict(result, order_id=order_id))
+        job["processed"] += 1
+        _save_bulk_job(bulk_job_id, job)
+        frappe.publish_realtime(
+            "order_bulk_job_progress",
+            {"job_id": bulk_job_id, "processed": job["processed"], "total": job["total"], "result": job["results"][-1]},
+            user=job["user"],
+        )
+
+    job["status"] = "completed"
+    _save_bulk_job(bulk_job_id, job)
+
+
+def _save_bulk_job(job_id, job):
+    frappe.cache().set_value(BULK_JOB_KEY.format(job_id=job_id), job, expires_in_sec=BULK_JOB_EXPIRY)
@@ -0,0 +1,167 @@
+import pickle
+
+import frappe
+from frappe import _
+from frappe.contacts.doctype.address.address import get_address_templates
+from jinja2 import TemplateSyntaxError
+
+# fields matched by the search text of an address listing
+SEARCH_FIELDS = ("address_title", "address_line1", "city")
+
+# address name => (modified, template version, rendered display)
+DISPLAY_CACHE_KEY = "address_display"
+
+# changes whenever an Address Template changes, so displays rendered with an old template are not served
+TEMPLATE_VERSION_KEY = "address_template_version"
+
+
+def get_party_addresses(party, address_type=None, txt=None, filters=None, limit_start=0, limit_page_length=0):
+    """
+    Return one page of the addresses linked to a party, with their display rendered.
+
+    Addresses, their links and the type filter are resolved in a single joined query,
+    and displays come from the display cache.
+
+    Args:
+        party (frappe.model.document.Document): The Customer or other party.
+        address_type (Optional[str]): Only return addresses of this type, e.g. "Shipping".
+        txt (Optional[str]): Search term matched against the title, first line and city.
+        filters (Optional[dict]): Additional filters on Address fields.
+        limit_start (int): The offset of the page.
+        limit_page_length (int): The size of the page, 0 for all addresses.
+
+    Returns:
+        list: frappe._dict rows with all Address fields and `display`, most recently modified first.
+    """
+    address_filters = [
+        ["Dynamic Link", "link_doctype", "=", party.doctype],
+        ["Dynamic Link", "link_name", "=", party.name],
+    ]
+    if address_type:
+        address_filters.append(["Address", "address_type", "=", address_type])
+    for fieldname, value in (filters or {}).items():
+        address_filters.append(["Address", fieldname, "=", value])
+
+    addresses = frappe.get_all(
+        "Address",
+        filters=address_filters,
+        or_filters=[["Address", fieldname, "like", f"%{txt}%"] for fieldname in SEARCH_FIELDS] if txt else None,
+        fields=["*"],
+        order_by="`tabAddress`.modified desc",
+        limit_start=limit_start,
+        limit_page_length=limit_page_length,
+        distinct=True,
+    )
+
+    for address, display in zip(addresses, get_address_displays(addresses)):
+        address.display = display
+
+    return addresses
+
+
+def get_party_address(party, address_name):
+    """
+    Return one address of a party, with its display rendered.
+
+    Raises:
+        frappe.DoesNotExistError: If the address does not exist or is not linked to the party.
+    """
+    addresses = get_party_addresses(party, filters={"name": address_name}, limit_page_length=1)
+    if not addresses:
+        frappe.throw(_("Address {0} not found").format(address_name), frappe.DoesNotExistError)
+
+    return addresses[0]
+
+
+def get_address_displays(addresses):
+    """
+    Return the display HTML of many addresses, rendering only the ones not cached yet.
+
+    Displays are cached per address along with the `modified` of the address and
+    the Address Template version they were rendered with, and all of them are
+    fetched in one round trip.
+
+    Args:
+        addresses (list): Address rows or documents.
+
+    Returns:
+        list: The displays, in the order of `addresses`.
+    """
+    if not addresses:
+        return []
+
+    cache_key = frappe.cache().make_key(DISPLAY_CACHE_KEY)
+    template_version = get_template_version()
+    displays = [None] * len(addresses)
+    missing = []
+
+    for i, (address, cached) in enumerate(
+        zip(addresses, frappe.cache().hmget(cache_key, [address.name for address in addresses]))
+    ):
+        if cached is not None:
+            modified, version, display = pickle.loads(cached)
+            if modified == str(address.modified) and version == template_version:
+                displays[i] = display
+                continue
+        missing.append(i)
+
+    if missing:
+        pipeline = frappe.cache().pipeline(transaction=False)
+        rendered = render_address_displays([addresses[i] for i in missing])
+        for i, display in zip(missing, rendered):
+            address = addresses[i]
+            displays[i] = display
+            pipeline.hset(cache_key, address.name, pickle.dumps((str(address.modified), template_version, display)))
+        pipeline.execute()
+
+    return displays
+
+
+def get_template_version():
+    return frappe.cache().get_value(TEMPLATE_VERSION_KEY, generator=lambda: frappe.generate_hash(length=10))
+
+
+def render_address_displays(addresses):
+    """
+    Render the display HTML of many addresses.
+
+    The Address Template of each country is looked up once for the whole list
+    instead of once per address.
+
+    Args:
+        addresses (list): Address rows or documents.
+
+    Returns:
+        list: The rendered displays, in the order of `addresses`.
+    """
+    templates = {}
+    displays = []
+    for address in addresses:
+        country = address.get("country")
+        if country not in templates:
+            templates[country] = get_address_templates(address)
+
+        name, template = templates[country]
+        try:
+            displays.append(frappe.render_template(template, address))
+        except TemplateSyntaxError:
+            frappe.throw(_("There is an error in your Address Template {0}").format(name))
+
+    return displays
+
+
+# Document events
+
+
+def clear_address_display(doc, method=None, *args, **kwargs):
+    """doc_events: drop the cached display of a changed, renamed or deleted Address."""
+    frappe.cache().hdel(DISPLAY_CACHE_KEY, doc.name)
+    if method == "after_rename" and args:
+        # args are (old, new, merge)
+        frappe.cache().hdel(DISPLAY_CACHE_KEY, args[0])
+
+
+def on_address_template_change(doc, method=None, *args, **kwargs):
+    """doc_events: displays rendered with the previous templates are stale, once the change is committed."""
+    frappe.cache().delete_value(TEMPLATE_VERSION_KEY)
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(TEMPLATE_VERSION_KEY))
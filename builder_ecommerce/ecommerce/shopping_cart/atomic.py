@@ -0,0 +1,48 @@
+import pickle
+
+import frappe
+from frappe import _
+from redis.exceptions import WatchError
+
+# Attempts before giving up on a value that keeps changing under us.
+MAX_ATTEMPTS = 10
+
+
+def update_value(key, change, expires_in_sec=None):
+    """
+    Read, change and write back a cached value as one optimistic transaction.
+
+    The key is WATCHed while `change` runs. If another request writes it in
+    between, nothing is written and `change` runs again on the newer value, so
+    concurrent changes are merged instead of overwriting each other. `change`
+    may run more than once and should not have other side effects.
+
+    Args:
+        key (str): The cache key, as passed to frappe.cache().get_value.
+        change (callable): Called with the current value (None when missing), returns the new value.
+        expires_in_sec (Optional[int]): Expiry of the written value.
+
+    Returns:
+        The new value.
+    """
+    cache = frappe.cache()
+    redis_key = cache.make_key(key)
+
+    for _attempt in range(MAX_ATTEMPTS):
+        with cache.pipeline() as pipeline:
+            try:
+                pipeline.watch(redis_key)
+                current = pipeline.get(redis_key)
+                value = change(pickle.loads(current) if current is not None else None)
+
+                pipeline.multi()
+                pipeline.set(redis_key, pickle.dumps(value), ex=expires_in_sec)
+                pipeline.execute()
+            except WatchError:
+                continue
+
+        # get_value memoizes per request, keep it in line with what was written
+        frappe.local.cache[redis_key] = value
+        return value
+
+    frappe.throw(_("The cart is being changed by another request, please try again"))
@@ -0,0 +1,183 @@
+"""Benchmark and golden check of the guest cart totals engine.
+
+Run with `bench --site <site> execute
+builder_ecommerce.ecommerce.shopping_cart.benchmark.run`. No database is
+needed, carts, items and the checkout configuration are generated.
+"""
+
+import random
+import time
+
+import frappe
+from frappe.utils import flt
+
+from builder_ecommerce.ecommerce.shopping_cart.totals import ShippingBands, TotalsEngine
+
+# carts per batch => shipping conditions of the rule
+SIZES = {
+    1: 5,
+    1000: 20,
+    10000: 100,
+}
+
+
+def legacy_totals(cart_items, weights, shipping_rule, taxes):
+    """The guest branch of calculate_taxes_and_totals before the engine, without formatting."""
+    total_weight = total_price = 0
+    total_excluded_tax = 0
+    order_summary = []
+
+    for item in cart_items:
+        qty = item.get("qty", 1)
+        price = item.get("price", 0)
+
+        weight_per_unit = weights.get(item.get("item_code")) or 0
+        total_weight += flt(weight_per_unit) * qty
+        total_price += flt(price) * qty
+
+    if shipping_rule:
+        for condition in shipping_rule.conditions:
+            if condition.from_value <= total_weight <= condition.to_value:
+                shipping_charge = condition.shipping_amount
+                total_excluded_tax += shipping_charge
+                order_summary.append(
+                    {"description": shipping_rule.name, "tax_amount": shipping_charge, "included_in_price": 0}
+                )
+                break
+
+    for tax_row in taxes:
+        if tax_row.charge_type == "On Net Total":
+            tax_rate = flt(tax_row.rate) / 100
+
+            if tax_row.included_in_print_rate:
+                included_tax = total_price - (total_price / (1 + tax_rate))
+            else:
+                excluded_tax = total_price * tax_rate
+                total_excluded_tax += excluded_tax
+
+            order_summary.append(
+                {
+                    "description": tax_row.description,
+                    "tax_amount": included_tax if tax_row.included_in_print_rate else excluded_tax,
+                    "included_in_price": tax_row.included_in_print_rate,
+                }
+            )
+
+    return {
+        "total_price": total_price,
+        "total_weight": total_weight,
+        "grand_total": total_price + total_excluded_tax,
+        "taxes": order_summary,
+    }
+
+
+def make_shipping_rule(conditions, rng):
+    """Bands of 0-5 kg with overlaps, gaps, single points and an empty range."""
+    rows = []
+    for i in range(conditions):
+        from_value = rng.choice([i * 5, i * 5 + 1, i * 5 - 2 if i else 0])
+        to_value = from_value + rng.choice([0, 3, 5, 8])
+        rows.append(frappe._dict(from_value=from_value, to_value=to_value, shipping_amount=rng.randint(0, 50) * 10))
+
+    rows.append(frappe._dict(from_value=10, to_value=2, shipping_amount=999))
+    rng.shuffle(rows)
+
+    return frappe._dict(name="Weight Shipping", conditions=rows)
+
+
+def make_taxes():
+    return [
+        frappe._dict(charge_type="On Net Total", rate=15, description="VAT", included_in_print_rate=1),
+        frappe._dict(charge_type="On Net Total", rate=2.5, description="Levy", included_in_print_rate=0),
+        frappe._dict(charge_type="Actual", rate=0, description="Handling", included_in_print_rate=0),
+        frappe._dict(charge_type="On Net Total", rate="7", description="City Tax", included_in_print_rate=0),
+    ]
+
+
+def make_carts(count, rng, items=200):
+    weights = {f"ITEM-{i:04d}": rng.choice([None, 0, 0.25, 0.5, 1, 1.5, 2, 3]) for i in range(items)}
+    item_codes = list(weights)
+    carts = []
+    for _ in range(count):
+        cart = []
+        for item_code in rng.sample(item_codes, rng.randint(0, 8)):
+            line = {"item_code": item_code, "qty": rng.randint(1, 4)}
+            if rng.random() > 0.1:
+                line["price"] = rng.choice([9.99, 10, 149.5, "25.75", 1200])
+            cart.append(line)
+        carts.append(cart)
+
+    # an unknown item and an item without qty
+    carts.append([{"item_code": "DELETED-ITEM", "qty": 2, "price": 5}, {"item_code": item_codes[0], "price": 3}])
+
+    return carts, weights
+
+
+def check_golden(seed=0, carts=2000, conditions=30):
+    """Assert the engine matches the legacy loop exactly, for generated carts and
+    for every weight on and around the band boundaries."""
+    rng = random.Random(seed)
+    shipping_rule = make_shipping_rule(conditions, rng)
+    taxes = make_taxes()
+    engine = TotalsEngine(shipping_rule, taxes)
+    generated, weights = make_carts(carts, rng)
+
+    for cart, totals in zip(generated, engine.compute(generated, weights)):
+        expected = legacy_totals(cart, weights, shipping_rule, taxes)
+        assert totals == expected, (cart, totals, expected)
+
+    bands = ShippingBands.from_conditions(shipping_rule.conditions)
+    for condition in shipping_rule.conditions:
+        for value in (condition.from_value, condition.to_value):
+            for weight in (value - 0.5, value - 1e-9, value, value + 1e-9, value + 0.5):
+                expected = next(
+                    (c.shipping_amount for c in shipping_rule.conditions if c.from_value <= weight <= c.to_value),
+                    None,
+                )
+                assert bands.get_amount(weight) == expected, (weight, bands.get_amount(weight), expected)
+
+    assert TotalsEngine(None, taxes).compute(generated[:1], weights) == [
+        legacy_totals(generated[0], weights, None, taxes)
+    ]
+
+    return True
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def run(sizes=None, repeat=None):
+    """Compare the legacy loop with the engine on batches of carts."""
+    check_golden()
+
+    results = []
+    rng = random.Random(1)
+    for size in sizes or SIZES:
+        shipping_rule = make_shipping_rule(SIZES[size], rng)
+        taxes = make_taxes()
+        carts, weights = make_carts(size, rng)
+        n = repeat or max(1, 2000 // size)
+
+        legacy_ms, expected = timeit(lambda: [legacy_totals(c, weights, shipping_rule, taxes) for c in carts], n)
+        engine_ms, totals = timeit(lambda: TotalsEngine(shipping_rule, taxes).compute(carts, weights), n)
+
+        assert totals == expected
+        results.append(
+            {
+                "carts": size,
+                "conditions": SIZES[size],
+                "legacy_ms": round(legacy_ms, 3),
+                "engine_ms": round(engine_ms, 3),
+                "speedup": round(legacy_ms / engine_ms, 1) if engine_ms else None,
+            }
+        )
+
+    for row in results:
+        print(row)
+
+    return results
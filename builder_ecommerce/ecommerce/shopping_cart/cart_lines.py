@@ -0,0 +1,128 @@
+import pickle
+
+import frappe
+from frappe.utils import cint, flt
+from redis.exceptions import WatchError
+
+from builder_ecommerce.ecommerce.shopping_cart.atomic import update_value
+from builder_ecommerce.ecommerce.shopping_cart.item_prices import get_item_prices
+
+# Pending cart changes of logged-in users live under this key until they are
+# folded into the cart Quotation. They never expire on their own: losing
+# them would lose the user's clicks. A folded cart is only deleted once the
+# Quotation save is committed, see discard_pending_cart.
+PENDING_CART_KEY = "pending_cart_lines::{user}"
+
+
+def is_deferred_save_enabled():
+    """Deferred cart saves are opt-in per site:
+    `bench --site <site> set-config builder_ecommerce_deferred_cart_save 1`."""
+    return cint(frappe.conf.get("builder_ecommerce_deferred_cart_save"))
+
+
+def get_pending_cart(user=None):
+    """
+    Return the cart changes of the user that are not yet saved to the Quotation.
+
+    Returns:
+        Optional[dict]: quotation (name), selling_price_list and lines
+                        (item_code => dict of qty, rate, additional_notes), or None.
+    """
+    return frappe.cache().get_value(get_pending_cart_key(user))
+
+
+def new_pending_cart(quotation_name):
+    """Start a pending cart from the current lines of the cart Quotation."""
+    lines = {}
+    for item in frappe.get_all(
+        "Quotation Item",
+        filters={"parent": quotation_name, "parenttype": "Quotation"},
+        fields=["item_code", "qty", "rate", "additional_notes"],
+        order_by="idx asc",
+    ):
+        lines[item.item_code] = {"qty": item.qty, "rate": item.rate, "additional_notes": item.additional_notes}
+
+    return {
+        "quotation": quotation_name,
+        "selling_price_list": frappe.db.get_value("Quotation", quotation_name, "selling_price_list"),
+        "lines": lines,
+    }
+
+
+def update_pending_cart(change, user=None):
+    """Change the pending cart of the user in one optimistic Redis transaction,
+    see atomic.update_value. `change` gets the current pending cart or None."""
+    return update_value(get_pending_cart_key(user), change)
+
+
+def discard_pending_cart(folded, user=None):
+    """
+    Delete the pending cart of the user if it is still the `folded` one.
+
+    The compare and delete are one optimistic Redis transaction, so a click
+    recorded after the cart was read keeps the pending cart. It holds the
+    folded lines too and is folded again next time.
+    """
+    cache = frappe.cache()
+    redis_key = cache.make_key(get_pending_cart_key(user))
+
+    with cache.pipeline() as pipeline:
+        try:
+            pipeline.watch(redis_key)
+            current = pipeline.get(redis_key)
+            if current is None or pickle.loads(current) != folded:
+                return
+
+            pipeline.multi()
+            pipeline.delete(redis_key)
+            pipeline.execute()
+        except WatchError:
+            return
+
+    frappe.local.cache.pop(redis_key, None)
+
+
+def apply_cart_line_change(pending, item_code, action, qty, additional_notes=None, update_notes=False):
+    """
+    Apply one cart change to a pending cart, the same way update_cart and
+    update_cart_qty change the Quotation items.
+
+    Args:
+        pending (dict): The pending cart, changed in place.
+        item_code (str): The item to change.
+        action (str): "add", "remove" or "delete".
+        qty (int or float): The quantity to add or remove.
+        additional_notes (Optional[str]): Notes for the line.
+        update_notes (bool): Whether to overwrite the notes of an existing line.
+    """
+    lines = pending["lines"]
+    line = lines.get(item_code)
+    qty = flt(qty)
+
+    if line:
+        if action == "add":
+            line["qty"] += qty
+            if update_notes:
+                line["additional_notes"] = additional_notes
+        elif action == "remove":
+            line["qty"] -= qty
+            if line["qty"] < 1:
+                del lines[item_code]
+        elif action == "delete":
+            del lines[item_code]
+
+    elif action == "add":
+        lines[item_code] = {
+            "qty": qty,
+            "rate": flt(get_item_prices(pending.get("selling_price_list"), [item_code]).get(item_code)),
+            "additional_notes": additional_notes,
+        }
+
+
+def get_pending_lines(pending):
+    """The pending lines as a list of dicts, in cart order."""
+    return [dict(line, item_code=item_code) for item_code, line in pending["lines"].items()]
+
+
+def get_pending_cart_key(user=None):
+    return PENDING_CART_KEY.format(user=user or frappe.session.user)
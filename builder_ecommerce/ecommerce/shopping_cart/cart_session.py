@@ -0,0 +1,73 @@
+import frappe
+
+# user => {"party": (doctype, name), "quotation": name of the draft cart Quotation}
+CACHE_KEY = "cart_session"
+
+
+def get_cart_session(user=None):
+    """Return the cached party and cart quotation of the user, or an empty dict."""
+    return frappe.cache().hget(CACHE_KEY, user or frappe.session.user) or {}
+
+
+def update_cart_session(user=None, **values):
+    user = user or frappe.session.user
+    session = dict(get_cart_session(user), **values)
+    frappe.cache().hset(CACHE_KEY, user, session)
+
+
+def clear_cart_session(user=None):
+    frappe.cache().hdel(CACHE_KEY, user or frappe.session.user)
+
+
+def clear_all_cart_sessions():
+    frappe.cache().delete_value(CACHE_KEY)
+
+
+# Document events
+
+
+def on_quotation_change(doc, method=None):
+    """Forget the cached cart quotation when it is created, submitted, cancelled,
+    deleted or moved to another party."""
+    if doc.order_type != "Shopping Cart" and not doc.has_value_changed("order_type"):
+        return
+
+    if method == "on_update" and not any(
+        doc.has_value_changed(field) for field in ("party_name", "contact_email", "order_type", "docstatus")
+    ):
+        return
+
+    users = {doc.contact_email}
+    before = doc.get_doc_before_save()
+    if before:
+        users.add(before.contact_email)
+
+    clear_cart_sessions(users)
+
+
+def on_contact_change(doc, method=None):
+    """The party of a user is resolved through their Contact."""
+    users = {d.email_id for d in doc.get("email_ids") or []}
+    users.add(doc.get("user"))
+    users.add(doc.get("email_id"))
+
+    clear_cart_sessions(users)
+
+
+def on_party_change(doc, method=None, *args, **kwargs):
+    """Renamed or deleted Customers can be in any session."""
+    clear_all_cart_sessions()
+    frappe.db.after_commit.add(clear_all_cart_sessions)
+
+
+def clear_cart_sessions(users):
+    """Clear now and once the change is committed: a request reading in between,
+    e.g. while a checkout job submits the Quotation, caches the old values again."""
+    users = list(filter(None, users))
+
+    def clear():
+        for user in users:
+            clear_cart_session(user)
+
+    clear()
+    frappe.db.after_commit.add(clear)
@@ -0,0 +1,56 @@
+import frappe
+
+# token => checkout record, see new_checkout
+CHECKOUT_KEY = "checkout::{token}"
+
+# Seconds a checkout record is kept for status polls.
+CHECKOUT_EXPIRY = 24 * 60 * 60
+
+QUEUED = "queued"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def new_checkout(**values):
+    """
+    Create a checkout record for the current user and return its token.
+
+    Returns:
+        str: The order token, an unguessable id the client polls the status with.
+    """
+    token = frappe.generate_hash(length=32)
+    save_checkout(token, dict(values, user=frappe.session.user, status=QUEUED))
+    return token
+
+
+def get_checkout(token):
+    """
+    Return the checkout record of a token.
+
+    Returns:
+        Optional[dict]: user, status and the payload the checkout was started with,
+                        plus sales_order and items once completed or error once failed.
+    """
+    if not token:
+        return None
+
+    return frappe.cache().get_value(get_checkout_key(token), expires=True)
+
+
+def update_checkout(token, **values):
+    checkout = get_checkout(token)
+    if checkout is None:
+        return None
+
+    checkout.update(values)
+    save_checkout(token, checkout)
+    return checkout
+
+
+def save_checkout(token, checkout):
+    frappe.cache().set_value(get_checkout_key(token), checkout, expires_in_sec=CHECKOUT_EXPIRY)
+
+
+def get_checkout_key(token):
+    return CHECKOUT_KEY.format(token=token)
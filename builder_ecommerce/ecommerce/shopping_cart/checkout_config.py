@@ -0,0 +1,84 @@
+import frappe
+
+from builder_ecommerce.ecommerce.shopping_cart.totals import ShippingBands
+
+CACHE_KEY = "checkout_config"
+
+# Rebuilt at least this often, in case an invalidating event was missed.
+CACHE_TTL = 60 * 60
+
+
+def get_checkout_config():
+    """
+    Return the site-level settings every cart path needs, as one cached snapshot.
+
+    Returns:
+        frappe._dict: currency, tax_template (name, modified and taxes rows of the default
+                      Sales Taxes and Charges Template, or None) and shipping_rule (name,
+                      modified, conditions and bands of the active weight based selling
+                      Shipping Rule, or None).
+    """
+    config = frappe.cache().get_value(CACHE_KEY)
+    if config is None:
+        config = build_checkout_config()
+        frappe.cache().set_value(CACHE_KEY, config, expires_in_sec=CACHE_TTL)
+
+    return config
+
+
+def build_checkout_config():
+    return frappe._dict(
+        currency=frappe.db.get_single_value("Global Defaults", "default_currency"),
+        tax_template=get_default_tax_template(),
+        shipping_rule=get_weight_shipping_rule(),
+    )
+
+
+def get_default_tax_template():
+    template = frappe.db.get_value(
+        "Sales Taxes and Charges Template", {"is_default": 1}, ["name", "modified"], as_dict=True
+    )
+    if not template:
+        return None
+
+    template.taxes = frappe.get_all(
+        "Sales Taxes and Charges",
+        filters={"parenttype": "Sales Taxes and Charges Template", "parent": template.name},
+        fields=["charge_type", "account_head", "rate", "description", "included_in_print_rate", "tax_amount"],
+        order_by="idx asc",
+    )
+
+    return template
+
+
+def get_weight_shipping_rule():
+    shipping_rule = frappe.get_all(
+        "Shipping Rule",
+        filters={
+            "shipping_rule_type": "Selling",
+            "calculate_based_on": "Net Weight",
+            "disabled": 0
+        },
+        fields=["name", "modified"],
+        limit=1
+    )
+    if not shipping_rule:
+        return None
+
+    shipping_rule = shipping_rule[0]
+    shipping_rule.conditions = frappe.get_all(
+        "Shipping Rule Condition",
+        filters={"parenttype": "Shipping Rule", "parent": shipping_rule.name},
+        fields=["from_value", "to_value", "shipping_amount"],
+        order_by="idx asc",
+    )
+    shipping_rule.bands = ShippingBands.from_conditions(shipping_rule.conditions)
+
+    return shipping_rule
+
+
+def clear_checkout_config(doc=None, method=None, *args, **kwargs):
+    """doc_events: drop the snapshot once the change is committed."""
+    frappe.cache().delete_value(CACHE_KEY)
+    if doc is not None:
+        frappe.db.after_commit.add(lambda: frappe.cache().delete_value(CACHE_KEY))
@@ -0,0 +1,114 @@
+"""Fire parallel cart updates at a site and count the ones that got lost.
+
+Run against a test site with
+
+    bench --site <site> execute builder_ecommerce.ecommerce.shopping_cart.concurrency.run \
+        --kwargs "{'item_code': 'ITEM-0001', 'user': 'buyer@example.com'}"
+
+Every worker thread has its own database connection, waits for the others and
+then adds the item to the same cart `clicks` times through update_cart_qty, the
+way fast double-clicks or two open tabs would. Guest runs need server-side
+guest carts enabled; all workers share one new guest cart.
+"""
+
+import pickle
+import threading
+import time
+
+import frappe
+
+from builder_ecommerce.cart import _get_cart_quotation_name, update_cart_qty
+from builder_ecommerce.ecommerce.shopping_cart.cart_lines import get_pending_cart_key
+from builder_ecommerce.ecommerce.shopping_cart.guest_cart import get_cart_key, is_server_side_cart_enabled
+
+
+def run(item_code, user="Guest", workers=8, clicks=5):
+    if user == "Guest" and not is_server_side_cart_enabled():
+        frappe.throw("Concurrent guest updates need server-side guest carts")
+
+    site, sites_path = frappe.local.site, frappe.local.sites_path
+    token = frappe.generate_hash(length=32) if user == "Guest" else None
+    workers, clicks = int(workers), int(clicks)
+
+    before = get_cart_qty(item_code, user, token)
+    barrier = threading.Barrier(workers)
+    errors = []
+
+    def worker():
+        frappe.init(site=site, sites_path=sites_path)
+        frappe.connect()
+        try:
+            frappe.set_user(user)
+            frappe.flags.guest_cart_token = token
+            barrier.wait()
+            for _ in range(clicks):
+                update_cart_qty(item_code, 1, "add")
+                frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            errors.append(repr(e))
+        finally:
+            frappe.destroy()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    # read the other connections' commits, not this transaction's snapshot
+    frappe.db.rollback()
+    after = get_cart_qty(item_code, user, token)
+    expected = before + workers * clicks
+
+    result = {
+        "user": user,
+        "updates": workers * clicks,
+        "seconds": round(seconds, 3),
+        "expected_qty": expected,
+        "qty": after,
+        "lost_updates": expected - after,
+        "errors": errors,
+    }
+    print(result)
+
+    return result
+
+
+def get_cart_qty(item_code, user, token=None):
+    """The quantity of the item in the cart, read straight from Redis and the database."""
+    if user == "Guest":
+        items = read_cache_value(get_cart_key(token)) or []
+        return sum(item["qty"] for item in items if item["item_code"] == item_code)
+
+    pending = read_cache_value(get_pending_cart_key(user))
+    if pending:
+        line = pending["lines"].get(item_code)
+        return line["qty"] if line else 0
+
+    session_user = frappe.session.user
+    frappe.set_user(user)
+    try:
+        quotation_name = _get_cart_quotation_name()
+    finally:
+        frappe.set_user(session_user)
+
+    if not quotation_name:
+        return 0
+
+    return frappe.db.sql(
+        """
+        SELECT COALESCE(SUM(qty), 0)
+        FROM `tabQuotation Item`
+        WHERE parenttype = 'Quotation' AND parent = %s AND item_code = %s
+        """,
+        (quotation_name, item_code),
+    )[0][0]
+
+
+def read_cache_value(key):
+    # bypass the per-request memo of get_value, the workers wrote from other threads
+    value = frappe.cache().get(frappe.cache().make_key(key))
+    return pickle.loads(value) if value is not None else None
@@ -0,0 +1,188 @@
+import json
+
+import frappe
+from frappe.utils import add_days, cint, flt, now_datetime
+
+from builder_ecommerce.ecommerce.shopping_cart.atomic import update_value
+
+# Cookie holding the opaque token of a server-side guest cart.
+TOKEN_COOKIE = "guest_cart"
+
+# Cookie that holds the whole cart when server-side carts are disabled.
+LEGACY_COOKIE = "cart_items"
+
+# Days a guest cart is kept after its last change.
+CART_EXPIRY_DAYS = 30
+
+
+def is_server_side_cart_enabled():
+    """Server-side guest carts are opt-in per site:
+    `bench --site <site> set-config builder_ecommerce_server_side_guest_cart 1`."""
+    return cint(frappe.conf.get("builder_ecommerce_server_side_guest_cart"))
+
+
+def get_guest_cart(cart_items=None):
+    """
+    Return the cart lines of the current guest.
+
+    With server-side carts the lines are read from Redis and `cart_items` is
+    only used once, to import a cart that still lives in the legacy cookie.
+    Otherwise `cart_items` (a JSON string or list sent by the client) is the cart.
+
+    Args:
+        cart_items (Optional[str | list]): The cart items sent by the client.
+
+    Returns:
+        list: The cart lines, dicts with item_code, qty and optionally price and notes.
+    """
+    if not is_server_side_cart_enabled():
+        return parse_cart_items(cart_items)
+
+    token = get_token()
+    if token:
+        items = frappe.cache().get_value(get_cart_key(token))
+        if items is not None:
+            return items
+
+    # first visit since server-side carts were enabled, migrate the cookie cart
+    items = parse_cart_items(cart_items or get_request_cookie(LEGACY_COOKIE))
+    if items:
+        save_guest_cart(items)
+
+    return items
+
+
+def save_guest_cart(cart_items):
+    """Persist the cart lines of the current guest."""
+    if not is_server_side_cart_enabled():
+        set_cookie(LEGACY_COOKIE, json.dumps(cart_items))
+        return
+
+    token = renew_token()
+    frappe.cache().set_value(
+        get_cart_key(token), cart_items, expires_in_sec=CART_EXPIRY_DAYS * 24 * 60 * 60
+    )
+
+    if get_request_cookie(LEGACY_COOKIE) and hasattr(frappe.local, "cookie_manager"):
+        frappe.local.cookie_manager.delete_cookie(LEGACY_COOKIE)
+
+
+def update_guest_cart(change, cart_items=None):
+    """
+    Change the cart lines of the current guest and persist them.
+
+    With server-side carts the read, change and write are one optimistic Redis
+    transaction: when two tabs change the cart at the same time, the change that
+    loses the race is applied again on top of the other one instead of
+    overwriting it.
+
+    Args:
+        change (callable): Called with the cart lines, changes them in place. May run more than once.
+        cart_items (Optional[str | list]): The cart items sent by the client, see get_guest_cart.
+
+    Returns:
+        list: The saved cart lines.
+    """
+    if not is_server_side_cart_enabled():
+        items = parse_cart_items(cart_items)
+        change(items)
+        save_guest_cart(items)
+        return items
+
+    def apply(items):
+        if items is None:
+            # first visit since server-side carts were enabled, migrate the cookie cart
+            items = [dict(item) for item in parse_cart_items(cart_items or get_request_cookie(LEGACY_COOKIE))]
+
+        change(items)
+        return items
+
+    token = renew_token()
+    items = update_value(get_cart_key(token), apply, expires_in_sec=CART_EXPIRY_DAYS * 24 * 60 * 60)
+
+    if get_request_cookie(LEGACY_COOKIE) and hasattr(frappe.local, "cookie_manager"):
+        frappe.local.cookie_manager.delete_cookie(LEGACY_COOKIE)
+
+    return items
+
+
+def clear_guest_cart():
+    if not is_server_side_cart_enabled():
+        set_cookie(LEGACY_COOKIE, json.dumps([]))
+        return
+
+    token = get_token()
+    if token:
+        frappe.cache().delete_value(get_cart_key(token))
+
+
+def apply_guest_cart_change(cart_items, item_code, action, qty, price=None, notes=None):
+    """
+    Apply one change to the cart lines of a guest, in place, the same way update_cart_qty does.
+
+    Args:
+        cart_items (list): The cart lines.
+        item_code (str): The item to change.
+        action (str): "add", "remove" or "delete".
+        qty (int): The quantity to add or remove.
+        price (Optional[float]): The price of a newly added line.
+        notes (Optional[str]): The notes of a newly added line.
+    """
+    qty = int(qty)
+    item = next((item for item in cart_items if item["item_code"] == item_code), None)
+
+    if item:
+        if action == "add":
+            item["qty"] += qty
+        elif action == "remove":
+            item["qty"] -= qty
+            if item["qty"] < 1:
+                cart_items.remove(item)
+        elif action == "delete":
+            cart_items.remove(item)
+
+    elif action == "add":
+        cart_items.append({"item_code": item_code, "qty": qty, "price": flt(price), "notes": notes})
+
+
+def parse_cart_items(cart_items):
+    if not cart_items:
+        return []
+
+    if isinstance(cart_items, str):
+        return json.loads(cart_items)
+
+    return list(cart_items)
+
+
+def get_token():
+    return frappe.flags.guest_cart_token or get_request_cookie(TOKEN_COOKIE)
+
+
+def renew_token():
+    """
+    Return the cart token of the current guest, creating one if needed.
+
+    The cookie is set again on every change so it expires CART_EXPIRY_DAYS after
+    the last change, like the cart itself, not after the cart was created.
+    """
+    token = get_token() or frappe.generate_hash(length=32)
+    frappe.flags.guest_cart_token = token
+    set_cookie(TOKEN_COOKIE, token, expires=add_days(now_datetime(), CART_EXPIRY_DAYS), httponly=True)
+    return token
+
+
+def get_cart_key(token):
+    return f"guest_cart::{token}"
+
+
+def get_request_cookie(name):
+    if not getattr(frappe.local, "request", None):
+        return None
+
+    return frappe.local.request.cookies.get(name)
+
+
+def set_cookie(name, value, **kwargs):
+    if hasattr(frappe.local, "cookie_manager"):
+        frappe.local.cookie_manager.set_cookie(name, value, **kwargs)
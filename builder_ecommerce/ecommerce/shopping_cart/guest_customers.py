@@ -0,0 +1,292 @@
+"""Index of the Customers and Contacts created by guest checkouts.
+
+Maps normalized emails and phone numbers to their (customer, contact), so a
+repeat guest buyer is recognised by their email, or by their phone when they
+give no email, and their party reused instead of a new Customer and Contact
+being created on every order.
+
+Only contacts without a website user are indexed. The index is a Redis hash
+kept in line by Contact events. Once it has been built completely (see
+rebuild_index) a miss means there is no such party; until then lookups fall
+back to the database.
+"""
+
+import pickle
+import re
+
+import frappe
+from frappe import _
+
+INDEX_KEY = "guest_customer_index"
+
+# field set once the index holds every contact, see rebuild_index
+BUILT_FIELD = "__built__"
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def normalize_phone(phone):
+    """Digits only, so "+880 1711-000000" and "8801711000000" match."""
+    return re.sub(r"\D", "", phone or "")
+
+
+def get_index_fields(email=None, phone=None):
+    fields = []
+    if normalize_email(email):
+        fields.append(f"email::{normalize_email(email)}")
+    if normalize_phone(phone):
+        fields.append(f"phone::{normalize_phone(phone)}")
+
+    return fields
+
+
+def find_guest_party(email=None, phone=None):
+    """
+    Return the existing Customer and Contact of a guest buyer, matched by email.
+
+    The phone number is only matched when no email is given: a party found by phone
+    alone may belong to someone else, who would get the order mails.
+
+    Args:
+        email (Optional[str]): The email the guest checked out with.
+        phone (Optional[str]): The phone number the guest checked out with.
+
+    Returns:
+        tuple: (Customer document, Contact document), or (None, None) if the buyer is new.
+    """
+    if normalize_email(email):
+        phone = None
+
+    fields = get_index_fields(email, phone)
+    if not fields:
+        return None, None
+
+    cache_key = frappe.cache().make_key(INDEX_KEY)
+    values = frappe.cache().hmget(cache_key, [*fields, BUILT_FIELD])
+    built = values.pop() is not None
+
+    for field, value in zip(fields, values):
+        if value is None:
+            continue
+
+        customer, contact = pickle.loads(value)
+        if frappe.db.exists("Customer", customer) and frappe.db.exists("Contact", contact):
+            return frappe.get_doc("Customer", customer), frappe.get_doc("Contact", contact)
+
+        # merged or deleted since it was indexed
+        frappe.cache().hdel(INDEX_KEY, field)
+
+    if built:
+        return None, None
+
+    enqueue_rebuild_index()
+    match = find_in_database(email, phone)
+    if not match:
+        return None, None
+
+    return frappe.get_doc("Customer", match[0]), frappe.get_doc("Contact", match[1])
+
+
+def find_in_database(email=None, phone=None):
+    """The oldest (customer, contact) with the email or phone, read from the contact tables."""
+    for row in iter_customer_contacts(email=normalize_email(email) or None, phone=normalize_phone(phone) or None):
+        return row[2], row[3]
+
+    return None
+
+
+def iter_customer_contacts(email=None, phone=None):
+    """
+    Stream the `(kind, normalized value, customer, contact)` of every email and phone
+    of contacts linked to a Customer, oldest contact first. Limited to one email or
+    phone when given. Contacts of website users are left out: their party is found
+    through the user, and a guest must not be able to order on their account.
+    """
+    conditions = []
+    values = {}
+    if email:
+        conditions.append("(kind = 'email' AND value = %(email)s)")
+        values["email"] = email
+    if phone:
+        conditions.append("(kind = 'phone' AND value = %(phone)s)")
+        values["phone"] = phone
+
+    where = f"WHERE {' OR '.join(conditions)}" if conditions else ""
+
+    yield from frappe.db.sql(
+        f"""
+        SELECT
+            kind, value, customer, contact
+        FROM (
+            SELECT
+                'email' AS kind, LOWER(TRIM(ce.email_id)) AS value,
+                dl.link_name AS customer, c.name AS contact, c.creation
+            FROM `tabContact Email` ce
+            INNER JOIN `tabContact` c ON c.name = ce.parent
+            INNER JOIN `tabDynamic Link` dl
+                ON dl.parent = c.name AND dl.parenttype = 'Contact' AND dl.link_doctype = 'Customer'
+            WHERE ce.parenttype = 'Contact' AND IFNULL(ce.email_id, '') != '' AND IFNULL(c.user, '') = ''
+
+            UNION ALL
+
+            SELECT
+                'phone' AS kind, REGEXP_REPLACE(cp.phone, '[^0-9]', '') AS value,
+                dl.link_name AS customer, c.name AS contact, c.creation
+            FROM `tabContact Phone` cp
+            INNER JOIN `tabContact` c ON c.name = cp.parent
+            INNER JOIN `tabDynamic Link` dl
+                ON dl.parent = c.name AND dl.parenttype = 'Contact' AND dl.link_doctype = 'Customer'
+            WHERE cp.parenttype = 'Contact' AND IFNULL(cp.phone, '') != '' AND IFNULL(c.user, '') = ''
+        ) contacts
+        {where}
+        ORDER BY creation, contact
+        """,
+        values,
+        as_iterator=True,
+    )
+
+
+def index_guest_party(customer, contact, email=None, phone=None):
+    """Add a newly created guest party to the index. Existing entries are kept, the oldest party wins."""
+    pipeline = frappe.cache().pipeline(transaction=False)
+    for field in get_index_fields(email, phone):
+        pipeline.hsetnx(frappe.cache().make_key(INDEX_KEY), field, pickle.dumps((customer, contact)))
+    pipeline.execute()
+
+
+def rebuild_index():
+    """Background job: rebuild the whole index from the contact tables and mark it complete."""
+    cache_key = frappe.cache().make_key(INDEX_KEY)
+    building_key = frappe.cache().make_key(f"{INDEX_KEY}::building")
+    pipeline = frappe.cache().pipeline(transaction=False)
+    pipeline.delete(building_key)
+
+    seen = set()
+    for kind, value, customer, contact in iter_customer_contacts():
+        field = f"{kind}::{value}"
+        if not value or field in seen:
+            continue
+
+        seen.add(field)
+        pipeline.hset(building_key, field, pickle.dumps((customer, contact)))
+        if len(pipeline) >= 1000:
+            pipeline.execute()
+
+    pipeline.hset(building_key, BUILT_FIELD, 1)
+    pipeline.rename(building_key, cache_key)
+    pipeline.execute()
+
+    return len(seen)
+
+
+def enqueue_rebuild_index():
+    frappe.enqueue(
+        "builder_ecommerce.ecommerce.shopping_cart.guest_customers.rebuild_index",
+        queue="long",
+        job_id="rebuild_guest_customer_index",
+        deduplicate=True,
+    )
+
+
+def merge_duplicate_customers(dry_run=False):
+    """
+    Merge the Customers and Contacts that guest checkouts created more than once for the same buyer.
+
+    Customers are grouped by the normalized email of their contacts. In every group the
+    oldest Customer is kept; the others are merged into it if they have no portal users,
+    i.e. were created by a guest checkout. Their contacts with the same email are merged
+    into the kept contact. Each merge is committed on its own.
+
+    Args:
+        dry_run (bool): Only report what would be merged.
+
+    Returns:
+        list: dicts of kept customer and contact and the merged customers and contacts.
+    """
+    portal_customers = set(
+        frappe.get_all("Portal User", filters={"parenttype": "Customer"}, pluck="parent", distinct=True)
+    )
+
+    # email => [(customer, contact)], oldest first
+    parties_by_email = {}
+    for kind, email, customer, contact in iter_customer_contacts():
+        if kind == "email":
+            parties_by_email.setdefault(email, []).append((customer, contact))
+
+    merged = []
+    merged_customers = set()
+    for email, parties in parties_by_email.items():
+        customers = list(dict.fromkeys(customer for customer, _ in parties if customer not in merged_customers))
+        if len(customers) < 2:
+            continue
+
+        keep_customer = customers[0]
+        keep_contact = next(contact for customer, contact in parties if customer == keep_customer)
+        duplicates = [c for c in customers[1:] if c not in portal_customers]
+        if not duplicates:
+            continue
+
+        duplicate_contacts = list(
+            dict.fromkeys(
+                contact for customer, contact in parties if customer in duplicates and contact != keep_contact
+            )
+        )
+        merged.append(
+            {
+                "email": email,
+                "customer": keep_customer,
+                "contact": keep_contact,
+                "merged_customers": duplicates,
+                "merged_contacts": duplicate_contacts,
+            }
+        )
+        merged_customers.update(duplicates)
+
+        if dry_run:
+            continue
+
+        try:
+            for customer in duplicates:
+                frappe.rename_doc("Customer", customer, keep_customer, merge=True, force=True)
+            for contact in duplicate_contacts:
+                frappe.rename_doc("Contact", contact, keep_contact, merge=True, force=True)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(title=_("Could not merge guest customers of {0}").format(email))
+            merged[-1]["error"] = True
+
+    if not dry_run:
+        rebuild_index()
+
+    return merged
+
+
+# Document events
+
+
+def on_contact_change(doc, method=None, *args, **kwargs):
+    """Index the emails and phones of contacts linked to a Customer; drop a deleted contact's entries."""
+    customers = [link.link_name for link in doc.get("links") or [] if link.link_doctype == "Customer"]
+    emails = [d.email_id for d in doc.get("email_ids") or []]
+    phones = [d.phone for d in doc.get("phone_nos") or []]
+
+    if method == "on_trash":
+        fields = [field for email in emails for field in get_index_fields(email=email)]
+        fields += [field for phone in phones for field in get_index_fields(phone=phone)]
+        if not fields:
+            return
+
+        cache_key = frappe.cache().make_key(INDEX_KEY)
+        for field, value in zip(fields, frappe.cache().hmget(cache_key, fields)):
+            if value is not None and pickle.loads(value)[1] == doc.name:
+                frappe.cache().hdel(INDEX_KEY, field)
+        return
+
+    if customers and not doc.get("user"):
+        for email in emails:
+            index_guest_party(customers[0], doc.name, email=email)
+        for phone in phones:
+            index_guest_party(customers[0], doc.name, phone=phone)
@@ -0,0 +1,78 @@
+import frappe
+from frappe import _
+from frappe.utils import cstr
+
+from builder_ecommerce.ecommerce.locks import release_lock
+from builder_ecommerce.ecommerce.shopping_cart.guest_cart import renew_token
+
+# user (or guest cart token) + client generated key => result of the first request with that key
+RESULT_KEY = "order_request::{scope}::{key}"
+
+# Seconds a result is kept; a form is not resubmitted after that.
+RESULT_EXPIRY = 24 * 60 * 60
+
+# Seconds the first request may take before its lock lapses.
+LOCK_TIMEOUT = 120
+
+# Seconds a repeated request waits for the first one to finish.
+LOCK_WAIT = 30
+
+MAX_KEY_LENGTH = 64
+
+
+def run_once(idempotency_key, fn):
+    """
+    Run `fn` once per idempotency key of the current user and return its result.
+
+    Repeated and concurrent requests with the same key wait for the first one and
+    get its result instead of doing the work again. Keys are scoped to the user,
+    and for guests to their guest cart token. The transaction is committed
+    before the result is stored, so a request that fails stores nothing and can
+    be retried with the same key.
+
+    Args:
+        idempotency_key (Optional[str]): The key generated by the client for one submission.
+                                         Without a key `fn` simply runs.
+        fn (callable): Does the work and returns a picklable result.
+
+    Returns:
+        The result of `fn`, from this request or the first one with the key.
+    """
+    if not idempotency_key:
+        return fn()
+
+    idempotency_key = cstr(idempotency_key)
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        frappe.throw(_("Invalid idempotency key"))
+
+    result_key = RESULT_KEY.format(scope=get_scope(), key=idempotency_key)
+    result = frappe.cache().get_value(result_key, expires=True)
+    if result is not None:
+        return result
+
+    lock = frappe.cache().lock(frappe.cache().make_key(f"{result_key}::lock"), timeout=LOCK_TIMEOUT)
+    if not lock.acquire(blocking=True, blocking_timeout=LOCK_WAIT):
+        frappe.throw(_("Your order is still being placed, please wait a moment"))
+
+    try:
+        # the request that held the lock may have finished meanwhile
+        result = frappe.cache().get_value(result_key, expires=True)
+        if result is not None:
+            return result
+
+        result = fn()
+        frappe.db.commit()
+        frappe.cache().set_value(result_key, result, expires_in_sec=RESULT_EXPIRY)
+
+        return result
+    finally:
+        release_lock(lock)
+
+
+def get_scope():
+    """The user, or for guests their guest cart token: every guest is the Guest user,
+    and must not get the result, i.e. the order, of another guest using the same key."""
+    if frappe.session.user == "Guest":
+        return f"Guest::{renew_token()}"
+
+    return frappe.session.user
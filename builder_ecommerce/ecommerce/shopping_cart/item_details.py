@@ -0,0 +1,66 @@
+import pickle
+
+import frappe
+
+# Item fields the cart pages need, cached per item code.
+ITEM_FIELDS = ("name", "item_name", "image", "weight_per_unit", "stock_uom")
+
+CACHE_KEY = "cart_item_details"
+
+# The hash is dropped at least this often, in case an invalidating event was missed.
+CACHE_TTL = 60 * 60
+
+
+def get_item_details(item_codes):
+    """
+    Return the cart fields of the given items in one round trip.
+
+    Items are read from the projection cache; the ones missing from it are
+    loaded with a single query and cached.
+
+    Args:
+        item_codes (list): The item codes to look up.
+
+    Returns:
+        dict: item_code => frappe._dict with item_name, image, weight_per_unit and stock_uom.
+              Unknown item codes are left out.
+    """
+    item_codes = list(dict.fromkeys(item_codes))
+    if not item_codes:
+        return {}
+
+    cache_key = frappe.cache().make_key(CACHE_KEY)
+    details = {}
+    missing = []
+    for item_code, value in zip(item_codes, frappe.cache().hmget(cache_key, item_codes)):
+        if value is None:
+            missing.append(item_code)
+        else:
+            details[item_code] = pickle.loads(value)
+
+    if missing:
+        pipeline = frappe.cache().pipeline(transaction=False)
+        for item in frappe.get_all("Item", filters={"name": ["in", missing]}, fields=ITEM_FIELDS):
+            details[item.name] = item
+            pipeline.hset(cache_key, item.name, pickle.dumps(item))
+        pipeline.ttl(cache_key)
+        if pipeline.execute()[-1] < 0:
+            frappe.cache().expire(cache_key, CACHE_TTL)
+
+    return details
+
+
+def clear_item_details(doc, method=None, *args, **kwargs):
+    """doc_events: drop the cached projection of a changed, renamed or deleted Item, now and
+    once the change is committed, as a request reading in between caches the old one again."""
+    item_codes = [doc.name]
+    if method == "after_rename" and args:
+        # args are (old, new, merge)
+        item_codes.append(args[0])
+
+    def clear():
+        for item_code in item_codes:
+            frappe.cache().hdel(CACHE_KEY, item_code)
+
+    clear()
+    frappe.db.after_commit.add(clear)
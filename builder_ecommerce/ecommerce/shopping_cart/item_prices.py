@@ -0,0 +1,179 @@
+import pickle
+
+import frappe
+from frappe.utils import add_days, get_datetime, getdate, now_datetime
+
+from builder_ecommerce.ecommerce.shopping_cart.item_details import get_item_details
+
+# price list => hash of item_code => price_list_rate, None for items without a price
+CACHE_KEY = "item_prices::{price_list}"
+
+# Each hash is dropped at least this often, in case an invalidating event was missed.
+CACHE_TTL = 60 * 60
+
+
+def get_item_prices(price_list, item_codes):
+    """
+    Return the rates of many items in a price list, in one round trip.
+
+    Rates are read from the price cache; the items missing from it are loaded
+    with a single query and cached, including the ones without a price.
+    Customer and supplier specific prices are left out, the cache is shared.
+    Only prices valid today in the stock UOM of the item (or without a UOM)
+    count, and the hash expires when the next of them starts or ends.
+
+    Args:
+        price_list (str): The price list. Defaults to the default selling price list.
+        item_codes (list): The item codes to look up.
+
+    Returns:
+        dict: item_code => price_list_rate. Items without a price are left out.
+    """
+    price_list = price_list or get_default_price_list()
+    item_codes = list(dict.fromkeys(item_codes))
+    if not price_list or not item_codes:
+        return {}
+
+    cache_key = frappe.cache().make_key(get_cache_key(price_list))
+    prices = {}
+    missing = []
+    for item_code, value in zip(item_codes, frappe.cache().hmget(cache_key, item_codes)):
+        if value is None:
+            missing.append(item_code)
+        else:
+            prices[item_code] = pickle.loads(value)
+
+    if missing:
+        loaded, expires_at = _load_item_prices(price_list, missing)
+
+        pipeline = frappe.cache().pipeline(transaction=False)
+        for item_code, rate in loaded.items():
+            prices[item_code] = rate
+            pipeline.hset(cache_key, item_code, pickle.dumps(rate))
+        pipeline.ttl(cache_key)
+        ttl = pipeline.execute()[-1]
+
+        # never keep a rate past the next valid_from/valid_upto change, and keep a shorter TTL
+        max_ttl = CACHE_TTL
+        if expires_at:
+            max_ttl = max(1, min(max_ttl, int((expires_at - now_datetime()).total_seconds())))
+        if ttl < 0 or ttl > max_ttl:
+            frappe.cache().expire(cache_key, max_ttl)
+
+    return {item_code: rate for item_code, rate in prices.items() if rate is not None}
+
+
+def _load_item_prices(price_list, item_codes):
+    """
+    Load the rates valid today for the given items, in one query.
+
+    A price in the stock UOM of the item wins over one without a UOM, prices in
+    other UOMs are ignored. Among equals the most recently modified row wins.
+
+    Returns:
+        tuple: (item_code => price_list_rate or None, datetime of the next
+        valid_from/valid_upto change or None)
+    """
+    today = getdate()
+    stock_uoms = {item_code: item.stock_uom for item_code, item in get_item_details(item_codes).items()}
+    loaded = dict.fromkeys(item_codes)
+    ranks = {}
+    changes = []
+
+    for row in frappe.get_all(
+        "Item Price",
+        filters={
+            "price_list": price_list,
+            "item_code": ["in", item_codes],
+            "customer": ["is", "not set"],
+            "supplier": ["is", "not set"],
+        },
+        or_filters=[["valid_upto", "is", "not set"], ["valid_upto", ">=", today]],
+        fields=["item_code", "price_list_rate", "uom", "valid_from", "valid_upto"],
+        order_by="modified desc",
+    ):
+        if row.valid_from and getdate(row.valid_from) > today:
+            changes.append(getdate(row.valid_from))
+            continue
+        if row.valid_upto:
+            changes.append(add_days(getdate(row.valid_upto), 1))
+
+        if not row.uom:
+            rank = 1
+        elif row.uom == stock_uoms.get(row.item_code):
+            rank = 0
+        else:
+            continue
+
+        if rank < ranks.get(row.item_code, 2):
+            ranks[row.item_code] = rank
+            loaded[row.item_code] = row.price_list_rate
+
+    return loaded, get_datetime(min(changes)) if changes else None
+
+
+def get_default_price_list():
+    """The selling price list of the site, used for guests."""
+    return frappe.defaults.get_defaults().get("selling_price_list") or frappe.db.get_single_value(
+        "Selling Settings", "selling_price_list"
+    )
+
+
+def apply_current_prices(cart_items, price_list=None):
+    """
+    Return the cart lines of a guest priced at the current rates of the price list.
+
+    Lines of items without a rate keep the price they were added with.
+    """
+    prices = get_item_prices(price_list, [item.get("item_code") for item in cart_items])
+    return [
+        dict(item, price=prices[item.get("item_code")]) if item.get("item_code") in prices else item
+        for item in cart_items
+    ]
+
+
+def get_cache_key(price_list):
+    return CACHE_KEY.format(price_list=price_list)
+
+
+def clear_entries(entries):
+    """Drop `(price_list, item_code)` entries from the price cache.
+
+    Run again after commit: a request reading between the first delete and the
+    commit caches the old rate again.
+    """
+    for price_list, item_code in entries:
+        frappe.cache().hdel(get_cache_key(price_list), item_code)
+
+
+# Document events
+
+
+def clear_item_price(doc, method=None, *args, **kwargs):
+    """doc_events: drop the cached rate of a changed or deleted Item Price, in its old price list too,
+    now and once the change is committed."""
+    entries = [(doc.price_list, doc.item_code)]
+
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    if before and (before.price_list, before.item_code) != (doc.price_list, doc.item_code):
+        entries.append((before.price_list, before.item_code))
+
+    clear_entries(entries)
+    frappe.db.after_commit.add(lambda: clear_entries(entries))
+
+
+def clear_item_prices_of_item(doc, method=None, *args, **kwargs):
+    """doc_events: a renamed or deleted Item may be cached in any price list."""
+    item_codes = [doc.name]
+    if method == "after_rename" and args:
+        # args are (old, new, merge)
+        item_codes.append(args[0])
+
+    entries = [
+        (price_list, item_code)
+        for price_list in frappe.get_all("Price List", pluck="name")
+        for item_code in item_codes
+    ]
+    clear_entries(entries)
+    frappe.db.after_commit.add(lambda: clear_entries(entries))
+
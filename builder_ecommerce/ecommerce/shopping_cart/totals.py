@@ -0,0 +1,153 @@
+"""Order totals of guest carts, for one cart or many at once.
+
+The tax rows and shipping bands of the checkout configuration are prepared
+once per TotalsEngine, so each cart costs one pass over its lines, a binary
+search for its shipping band and a pass over the tax rates. The results are
+the same, to the last bit, as the line by line loop calculate_taxes_and_totals
+used to run for guests.
+"""
+
+from bisect import bisect_left
+
+from frappe.utils import flt
+
+from builder_ecommerce.ecommerce.shopping_cart.item_details import get_item_details
+
+
+class ShippingBands:
+    """The conditions of a weight based Shipping Rule, searchable by weight.
+
+    Conditions are closed `[from_value, to_value]` ranges that may overlap or
+    leave gaps, and the first one in table order wins. They are cut into
+    elementary segments, every boundary value and the open range between two
+    consecutive boundaries, and each segment is resolved to its winning
+    shipping amount up front.
+    """
+
+    def __init__(self, points, point_amounts, gap_amounts):
+        # sorted distinct boundary values of all conditions
+        self.points = points
+        # shipping amount at points[i], None when no condition covers it
+        self.point_amounts = point_amounts
+        # shipping amount strictly between points[i] and points[i + 1]
+        self.gap_amounts = gap_amounts
+
+    @classmethod
+    def from_conditions(cls, conditions):
+        ranges = [
+            (condition.from_value, condition.to_value, condition.shipping_amount)
+            for condition in conditions
+            if condition.from_value <= condition.to_value
+        ]
+        points = sorted({value for from_value, to_value, _ in ranges for value in (from_value, to_value)})
+
+        def first_amount(covers):
+            return next((amount for from_value, to_value, amount in ranges if covers(from_value, to_value)), None)
+
+        return cls(
+            points,
+            [first_amount(lambda lo, hi: lo <= point <= hi) for point in points],
+            # an open segment lies either completely inside a condition or outside of it
+            [first_amount(lambda lo, hi: lo <= start and end <= hi) for start, end in zip(points, points[1:])],
+        )
+
+    def get_amount(self, weight):
+        """The shipping amount for a total weight, or None when no condition matches."""
+        i = bisect_left(self.points, weight)
+        if i < len(self.points) and self.points[i] == weight:
+            return self.point_amounts[i]
+
+        if 0 < i < len(self.points):
+            return self.gap_amounts[i - 1]
+
+        return None
+
+
+class TotalsEngine:
+    def __init__(self, shipping_rule=None, taxes=()):
+        self.shipping_rule_name = shipping_rule.name if shipping_rule else None
+        self.shipping_bands = None
+        if shipping_rule:
+            self.shipping_bands = shipping_rule.get("bands") or ShippingBands.from_conditions(
+                shipping_rule.conditions
+            )
+
+        # only net total based rows apply to a guest cart
+        self.taxes = [
+            (tax_row.description, flt(tax_row.rate) / 100, tax_row.included_in_print_rate)
+            for tax_row in taxes
+            if tax_row.charge_type == "On Net Total"
+        ]
+
+    @classmethod
+    def from_checkout_config(cls, checkout_config):
+        tax_template = checkout_config.tax_template
+        return cls(checkout_config.shipping_rule, tax_template.taxes if tax_template else ())
+
+    def compute(self, carts, weights):
+        """
+        Compute the totals of a batch of carts.
+
+        Args:
+            carts (list): Lists of cart lines, dicts with item_code, qty and price.
+            weights (dict): item_code => weight per unit.
+
+        Returns:
+            list: One dict per cart, in order, with total_price, total_weight,
+                  grand_total and taxes (description, tax_amount, included_in_price),
+                  the shipping charge first when a condition matched.
+        """
+        return [self.compute_cart(cart, weights) for cart in carts]
+
+    def compute_cart(self, cart_items, weights):
+        total_weight = total_price = 0
+        for item in cart_items:
+            qty = item.get("qty", 1)
+            total_weight += flt(weights.get(item.get("item_code")) or 0) * qty
+            total_price += flt(item.get("price", 0)) * qty
+
+        total_excluded_tax = 0
+        taxes = []
+
+        if self.shipping_bands:
+            shipping_charge = self.shipping_bands.get_amount(total_weight)
+            if shipping_charge is not None:
+                total_excluded_tax += shipping_charge
+                taxes.append(
+                    {"description": self.shipping_rule_name, "tax_amount": shipping_charge, "included_in_price": 0}
+                )
+
+        for description, tax_rate, included_in_price in self.taxes:
+            if included_in_price:
+                tax_amount = total_price - (total_price / (1 + tax_rate))
+            else:
+                tax_amount = total_price * tax_rate
+                total_excluded_tax += tax_amount
+
+            taxes.append({"description": description, "tax_amount": tax_amount, "included_in_price": included_in_price})
+
+        return {
+            "total_price": total_price,
+            "total_weight": total_weight,
+            "grand_total": total_price + total_excluded_tax,
+            "taxes": taxes,
+        }
+
+
+def get_guest_totals(carts, checkout_config):
+    """
+    Compute the totals of guest carts.
+
+    The item weights of all carts are looked up in one batch.
+
+    Args:
+        carts (list): Lists of cart lines, dicts with item_code, qty and price.
+        checkout_config (frappe._dict): The shipping rule and tax template, from get_checkout_config.
+
+    Returns:
+        list: The totals of each cart, see TotalsEngine.compute.
+    """
+    items_details = get_item_details([item.get("item_code") for cart in carts for item in cart])
+    weights = {item_code: details.weight_per_unit for item_code, details in items_details.items()}
+
+    return TotalsEngine.from_checkout_config(checkout_config).compute(carts, weights)
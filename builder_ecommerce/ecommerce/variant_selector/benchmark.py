@@ -0,0 +1,164 @@
+"""Benchmarks for the variant selector.
+
+Run with `bench --site <site> execute
+builder_ecommerce.ecommerce.variant_selector.benchmark.run` or plain
+`python -m builder_ecommerce.ecommerce.variant_selector.benchmark`; neither
+needs a database, the variants are generated.
+"""
+
+import itertools
+import pickle
+import time
+import tracemalloc
+
+from builder_ecommerce.ecommerce.variant_selector import compact
+from builder_ecommerce.ecommerce.variant_selector.variant_index import VariantIndex
+
+# variants per template => values per attribute (size x colour x material)
+SIZES = {
+    10: (5, 2),
+    1000: (10, 10, 10),
+    50000: (50, 40, 25),
+}
+
+
+def make_rows(shape):
+    attributes = [f"Attribute {i}" for i in range(len(shape))]
+    rows = []
+    for n, values in enumerate(itertools.product(*[range(count) for count in shape])):
+        item_code = f"ITEM-{n:06d}"
+        for attribute, value in zip(attributes, values):
+            rows.append((item_code, attribute, f"Value {value}"))
+
+    return attributes, rows
+
+
+def legacy_select(rows, attributes, attribute_value_item_map, item_attribute_value_map, selected_attributes):
+    """The pre-index implementation of get_next_attribute_and_values."""
+    filtered_items = set.intersection(
+        *[set(attribute_value_item_map.get((a, v), [])) for a, v in selected_attributes.items()]
+    )
+
+    valid_options_for_attributes = {}
+    for a in attributes:
+        valid_options_for_attributes[a] = set()
+        if selected_attributes.get(a):
+            valid_options_for_attributes[a].add(selected_attributes[a])
+
+    for item_code, attribute, attribute_value in rows:
+        if item_code in filtered_items and attribute not in selected_attributes and attribute in attributes:
+            valid_options_for_attributes[attribute].add(attribute_value)
+
+    exact_match = []
+    for item_code, attr_dict in item_attribute_value_map.items():
+        if item_code in filtered_items and set(attr_dict.keys()) == set(selected_attributes.keys()):
+            exact_match.append(item_code)
+
+    return exact_match[0] if exact_match else None
+
+
+def index_select(index, attributes, selected_attributes):
+    filtered_items = index.filter(selected_attributes)
+    index.get_valid_options(filtered_items, [a for a in attributes if a not in selected_attributes])
+    return index.get_first_item(index.filter_exact(filtered_items, selected_attributes.keys()))
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def run(sizes=None, repeat=None):
+    """Compare one full selection (every attribute chosen) per template size."""
+    results = []
+    for size in sizes or SIZES:
+        shape = SIZES[size]
+        attributes, rows = make_rows(shape)
+        selected_attributes = {attribute: f"Value {count - 1}" for attribute, count in zip(attributes, shape)}
+
+        attribute_value_item_map = {}
+        item_attribute_value_map = {}
+        for item_code, attribute, attribute_value in rows:
+            attribute_value_item_map.setdefault((attribute, attribute_value), []).append(item_code)
+            item_attribute_value_map.setdefault(item_code, {})[attribute] = attribute_value
+
+        build_ms, index = timeit(lambda: VariantIndex.from_rows(rows), 1)
+
+        n = repeat or max(1, 20000 // size)
+        legacy_ms, legacy_match = timeit(
+            lambda: legacy_select(
+                rows, attributes, attribute_value_item_map, item_attribute_value_map, selected_attributes
+            ),
+            n,
+        )
+        index_ms, index_match = timeit(lambda: index_select(index, attributes, selected_attributes), n)
+
+        assert legacy_match == index_match, (legacy_match, index_match)
+        results.append(
+            {
+                "variants": size,
+                "index_build_ms": round(build_ms, 3),
+                "legacy_ms": round(legacy_ms, 4),
+                "index_ms": round(index_ms, 4),
+                "speedup": round(legacy_ms / index_ms, 1) if index_ms else None,
+            }
+        )
+
+    for row in results:
+        print(row)
+
+    return results
+
+
+def run_encoding(sizes=None, repeat=None):
+    """Compare the stored size, unpickled memory and decode time of the plain
+    (rows + index dict) and compact encodings of a template's variants."""
+    results = []
+    for size in sizes or SIZES:
+        attributes, rows = make_rows(SIZES[size])
+        index = VariantIndex.from_rows(rows)
+        n = repeat or max(1, 2000 // size)
+
+        for encoding, payload, decode in (
+            ("plain", {"item_variants_data": rows, "index": index.to_dict()}, decode_plain),
+            ("compact", compact.encode(rows, index), compact.decode_index),
+        ):
+            data = pickle.dumps(payload)
+            decode_ms, decoded = timeit(lambda: decode(pickle.loads(data)), n)
+            assert decoded.value_masks == index.value_masks
+
+            results.append(
+                {
+                    "variants": size,
+                    "encoding": encoding,
+                    "pickled_kb": round(len(data) / 1024, 1),
+                    "unpickled_kb": round(measure_memory(lambda: pickle.loads(data)) / 1024, 1),
+                    "decode_ms": round(decode_ms, 3),
+                }
+            )
+
+    for row in results:
+        print(row)
+
+    return results
+
+
+def decode_plain(payload):
+    return VariantIndex.from_dict(payload["index"])
+
+
+def measure_memory(fn):
+    tracemalloc.start()
+    try:
+        result = fn()  # noqa: F841 - keep the result alive while measuring
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    run()
+    run_encoding()
@@ -0,0 +1,63 @@
+"""Compact encoding of the variant rows and index of a template.
+
+Every string (item codes, attributes, values) is stored once in a string
+table, and rows and mask keys refer to it by position through arrays of
+unsigned ints. This pickles far smaller than lists of string tuples, and
+unpickling an array is a single memcpy.
+"""
+
+from array import array
+
+from builder_ecommerce.ecommerce.variant_selector.variant_index import VariantIndex
+
+# item codes, attributes and attribute values never contain NUL
+SEPARATOR = "\x00"
+
+
+def encode(item_variants_data, variant_index):
+    ids = {}
+
+    def intern(value):
+        return ids.setdefault(value, len(ids))
+
+    rows = [i for row in item_variants_data for i in map(intern, row)]
+    variants = list(map(intern, variant_index.variants))
+    value_pairs = [i for pair in variant_index.value_masks for i in map(intern, pair)]
+    attribute_ids = list(map(intern, variant_index.attribute_masks))
+
+    # two bytes per id as long as the template has fewer than 65536 strings
+    typecode = "H" if len(ids) <= 0xFFFF else "I"
+
+    return {
+        "strings": SEPARATOR.join(ids),
+        "rows": array(typecode, rows),
+        "variants": array(typecode, variants),
+        "value_pairs": array(typecode, value_pairs),
+        "value_masks": list(variant_index.value_masks.values()),
+        "attribute_ids": array(typecode, attribute_ids),
+        "attribute_masks": list(variant_index.attribute_masks.values()),
+    }
+
+
+def get_strings(data):
+    return data["strings"].split(SEPARATOR)
+
+
+def decode_rows(data, strings=None):
+    """The `(item_code, attribute, attribute_value)` rows, in stored order."""
+    strings = strings or get_strings(data)
+    rows = data["rows"]
+    lookup = strings.__getitem__
+    return list(zip(map(lookup, rows[0::3]), map(lookup, rows[1::3]), map(lookup, rows[2::3])))
+
+
+def decode_index(data, strings=None):
+    strings = strings or get_strings(data)
+    lookup = strings.__getitem__
+    value_pairs = data["value_pairs"]
+
+    return VariantIndex(
+        list(map(lookup, data["variants"])),
+        dict(zip(zip(map(lookup, value_pairs[0::2]), map(lookup, value_pairs[1::2])), data["value_masks"])),
+        dict(zip(map(lookup, data["attribute_ids"]), data["attribute_masks"])),
+    )
@@ -1,45 +1,136 @@
+import hashlib
+import json
+import time
+from collections import Counter
+
 import frappe
 
+from builder_ecommerce.ecommerce.locks import release_lock
+from builder_ecommerce.ecommerce.variant_selector import compact
+from builder_ecommerce.ecommerce.variant_selector.variant_index import VariantIndex
+
+# All variant data of a template lives in one record under this hash, so a
+# getter costs at most one Redis round trip per request.
+CACHE_KEY = "item_variants_compact"
+
+# Bump whenever the layout of the cached record changes; records written with
+# another version are treated as missing and rebuilt.
+CACHE_VERSION = 4
+
+# Key of the per-request memo in `frappe.local.cache`.
+MEMO_KEY = "builder_ecommerce:item_variants_cache"
+
+# Records older than this are still served, but trigger a background rebuild.
+STALE_AFTER = 6 * 60 * 60
+
+# A builder holding the lock for longer than this is assumed to be dead.
+LOCK_TIMEOUT = 120
+
+# How long a request waits for another builder before building on its own.
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.1
+
+# Read path counters, flushed from each process to this hash.
+METRICS_KEY = "item_variants_cache_metrics"
+METRICS_FLUSH_INTERVAL = 30
+
+_metrics = Counter()
+_metrics_flushed_at = time.monotonic()
+
 
 class ItemVariantsCacheManager:
 	def __init__(self, item_code):
 		self.item_code = item_code
 
 	def get_item_variants_data(self):
-		val = frappe.cache().hget("item_variants_data", self.item_code)
-
-		if not val:
-			self.build_cache()
+		record = self.get_record()
+		if record.item_variants_data is None:
+			record.item_variants_data = get_record_rows(record)
 
-		return frappe.cache().hget("item_variants_data", self.item_code)
+		return record.item_variants_data
 
 	def get_attribute_value_item_map(self):
-		val = frappe.cache().hget("attribute_value_item_map", self.item_code)
+		record = self.get_record()
+		if record.attribute_value_item_map is None:
+			expand_record(record)
 
-		if not val:
-			self.build_cache()
-
-		return frappe.cache().hget("attribute_value_item_map", self.item_code)
+		return record.attribute_value_item_map
 
 	def get_item_attribute_value_map(self):
-		val = frappe.cache().hget("item_attribute_value_map", self.item_code)
-
-		if not val:
-			self.build_cache()
+		record = self.get_record()
+		if record.item_attribute_value_map is None:
+			expand_record(record)
 
-		return frappe.cache().hget("item_attribute_value_map", self.item_code)
+		return record.item_attribute_value_map
 
 	def get_optional_attributes(self):
-		val = frappe.cache().hget("optional_attributes", self.item_code)
-
-		if not val:
-			self.build_cache()
-
-		return frappe.cache().hget("optional_attributes", self.item_code)
+		return self.get_record().optional_attributes
+
+	def get_attributes(self):
+		return self.get_record().attributes
+
+	def get_variant_index(self):
+		record = self.get_record()
+		if record.variant_index is None:
+			record.variant_index = get_record_index(record)
+
+		return record.variant_index
+
+	def get_record(self):
+		"""Return the cached record of this template, memoized for the current request."""
+		memo = get_memo()
+		record = memo.get(self.item_code)
+		if record is not None:
+			return record
+
+		val = frappe.cache().hget(CACHE_KEY, self.item_code)
+		if not is_valid_record(val):
+			val = self.build_or_wait()
+		elif is_stale_record(val):
+			# serve the stale record, a single background job refreshes it
+			record_metric("stale")
+			enqueue_build_cache(self.item_code)
+		else:
+			record_metric("hit")
+
+		record = frappe._dict(
+			val,
+			item_variants_data=val.get("item_variants_data"),
+			attribute_value_item_map=None,
+			item_attribute_value_map=None,
+			variant_index=None,
+		)
+		memo[self.item_code] = record
+		return record
+
+	def build_or_wait(self):
+		"""Build a missing record under the build lock.
+
+		Only one request builds a template at a time; the others wait for its
+		result and, if it does not arrive in time, build it without storing it.
+		"""
+		lock = get_build_lock(self.item_code)
+		if lock.acquire(blocking=False):
+			record_metric("miss_build")
+			try:
+				return self.build_cache()
+			finally:
+				release_lock(lock)
+
+		deadline = time.monotonic() + LOCK_WAIT
+		while time.monotonic() < deadline:
+			time.sleep(LOCK_POLL_INTERVAL)
+			val = read_stored_record(self.item_code)
+			if is_valid_record(val):
+				record_metric("miss_wait")
+				return val
+
+		record_metric("miss_timeout")
+		return self.build_cache(store=False)
 
 	def get_ordered_attribute_values(self):
 		val = frappe.cache().get_value("ordered_attribute_values_map")
-		if val:
+		if val is not None:
 			return val
 
 		all_attribute_values = frappe.get_all(
@@ -53,7 +144,7 @@ class ItemVariantsCacheManager:
 		frappe.cache().set_value("ordered_attribute_values_map", ordered_attribute_values_map)
 		return ordered_attribute_values_map
 
-	def build_cache(self):
+	def build_cache(self, store=True):
 		parent_item_code = self.item_code
 
 		attributes = [
@@ -76,55 +167,344 @@ class ItemVariantsCacheManager:
 		)
 		item_variants_data = query.run()
 
-		attribute_value_item_map = frappe._dict()
-		item_attribute_value_map = frappe._dict()
+		record = make_record(attributes, item_variants_data, self.get_ordered_attribute_values())
+		if store:
+			frappe.cache().hset(CACHE_KEY, parent_item_code, record)
+			get_memo().pop(parent_item_code, None)
+
+		return record
+
+	def patch_cache(self, attributes=None, variant_code=None, variant_rows=None):
+		"""Patch the stored record in place instead of rebuilding it.
+
+		`attributes` replaces the ordered template attributes, `variant_rows`
+		replaces the `(attribute, attribute_value)` rows of `variant_code`
+		(an empty list drops the variant). Nothing is done if no record is
+		stored; it will be built on the next read. Returns False if the
+		build lock could not be taken.
+		"""
+		lock = get_build_lock(self.item_code)
+		if not lock.acquire(blocking=True, blocking_timeout=LOCK_WAIT):
+			return False
+
+		try:
+			# other workers may have patched it since this job last read it
+			val = read_stored_record(self.item_code)
+			if not is_valid_record(val):
+				return True
+
+			if attributes is None:
+				attributes = val["attributes"]
+
+			item_variants_data = get_record_rows(val)
+			if variant_code:
+				item_variants_data = [row for row in item_variants_data if row[0] != variant_code]
+				item_variants_data += [
+					(variant_code, attribute, attribute_value) for attribute, attribute_value in variant_rows or []
+				]
+
+			record = make_record(attributes, item_variants_data, self.get_ordered_attribute_values())
+			frappe.cache().hset(CACHE_KEY, self.item_code, record)
+			get_memo().pop(self.item_code, None)
+		finally:
+			release_lock(lock)
+
+		return True
 
-		for row in item_variants_data:
-			item_code, attribute, attribute_value = row
-			# (attr, value) => [item1, item2]
-			attribute_value_item_map.setdefault((attribute, attribute_value), []).append(item_code)
-			# item => {attr1: value1, attr2: value2}
-			item_attribute_value_map.setdefault(item_code, {})[attribute] = attribute_value
+	def clear_cache(self):
+		frappe.cache().hdel(CACHE_KEY, self.item_code)
+		get_memo().pop(self.item_code, None)
 
-		optional_attributes = set()
-		for item_code, attr_dict in item_attribute_value_map.items():
-			for attribute in attributes:
-				if attribute not in attr_dict:
-					optional_attributes.add(attribute)
+	def rebuild_cache(self):
+		"""Refresh the record in the background, serving the current one meanwhile."""
+		get_memo().pop(self.item_code, None)
+		enqueue_build_cache(self.item_code)
 
-		frappe.cache().hset("attribute_value_item_map", parent_item_code, attribute_value_item_map)
-		frappe.cache().hset("item_attribute_value_map", parent_item_code, item_attribute_value_map)
-		frappe.cache().hset("item_variants_data", parent_item_code, item_variants_data)
-		frappe.cache().hset("optional_attributes", parent_item_code, optional_attributes)
 
-	def clear_cache(self):
-		keys = [
-			"attribute_value_item_map",
-			"item_attribute_value_map",
-			"item_variants_data",
-			"optional_attributes",
-		]
+def make_record(attributes, item_variants_data, ordered_attribute_values):
+	"""Build the cache record of a template from its ordered attributes and
+	`(item_code, attribute, attribute_value)` rows.
 
-		for key in keys:
-			frappe.cache().hdel(key, self.item_code)
+	Only the rows and their bitset index, both compactly encoded, and the
+	selector payload are stored; the lookup maps are derived on read.
+	"""
+	item_variants_data = [tuple(row) for row in item_variants_data]
+
+	present_attributes = {}
+	for item_code, attribute, attribute_value in item_variants_data:
+		present_attributes.setdefault(item_code, set()).add(attribute)
+
+	optional_attributes = set()
+	for item_attributes in present_attributes.values():
+		for attribute in attributes:
+			if attribute not in item_attributes:
+				optional_attributes.add(attribute)
+
+	variant_index = VariantIndex.from_rows(item_variants_data)
+	attributes_and_values = get_attributes_and_values_payload(
+		attributes, optional_attributes, variant_index, ordered_attribute_values
+	)
+
+	return {
+		"version": CACHE_VERSION,
+		"built_at": time.time(),
+		"attributes": list(attributes),
+		"optional_attributes": optional_attributes,
+		"variants": compact.encode(item_variants_data, variant_index),
+		"attributes_and_values": attributes_and_values,
+		"etag": hashlib.sha1(json.dumps(attributes_and_values).encode()).hexdigest(),
+	}
 
-	def rebuild_cache(self):
-		self.clear_cache()
-		enqueue_build_cache(self.item_code)
+
+def get_attributes_and_values_payload(attributes, optional_attributes, variant_index, ordered_attribute_values):
+	"""The attributes of a template with the values at least one variant has,
+	in Item Attribute order, as served by `get_attributes_and_values`."""
+	valid_options = variant_index.get_valid_options(variant_index.all_mask, attributes)
+
+	payload = []
+	for attribute in attributes:
+		d = {"attribute": attribute}
+		if attribute in optional_attributes:
+			d["optional"] = True
+
+		d["values"] = [v for v in ordered_attribute_values.get(attribute, []) if v in valid_options[attribute]]
+		payload.append(d)
+
+	return payload
+
+
+def expand_record(record):
+	"""Derive the lookup maps of a record in place."""
+	attribute_value_item_map = frappe._dict()
+	item_attribute_value_map = frappe._dict()
+
+	for item_code, attribute, attribute_value in get_record_rows(record):
+		# (attr, value) => [item1, item2]
+		attribute_value_item_map.setdefault((attribute, attribute_value), []).append(item_code)
+		# item => {attr1: value1, attr2: value2}
+		item_attribute_value_map.setdefault(item_code, {})[attribute] = attribute_value
+
+	record.attribute_value_item_map = attribute_value_item_map
+	record.item_attribute_value_map = item_attribute_value_map
+
+
+def is_valid_record(val):
+	return isinstance(val, dict) and val.get("version") == CACHE_VERSION
+
+
+def get_record_rows(val):
+	if val.get("item_variants_data") is not None:
+		# rows already decoded for this request
+		return val["item_variants_data"]
+
+	return compact.decode_rows(val["variants"])
+
+
+def get_record_index(val):
+	return compact.decode_index(val["variants"])
+
+
+def is_stale_record(val):
+	return time.time() - val.get("built_at", 0) > STALE_AFTER
+
+
+def read_stored_record(item_code):
+	"""Read the stored record of a template from Redis.
+
+	`hget` memoizes values in `frappe.local.cache` for the whole request or job,
+	so polling or a read-modify-write through it would only see this process's
+	own earlier copy.
+	"""
+	frappe.local.cache.get(frappe.cache().make_key(CACHE_KEY), {}).pop(item_code, None)
+	return frappe.cache().hget(CACHE_KEY, item_code)
+
+
+def get_memo():
+	return frappe.local.cache.setdefault(MEMO_KEY, {})
+
+
+def get_build_lock(item_code):
+	return frappe.cache().lock(
+		frappe.cache().make_key(f"item_variants_cache_lock:{item_code}"), timeout=LOCK_TIMEOUT
+	)
 
 
 def build_cache(item_code):
-	frappe.cache().hset("item_cache_build_in_progress", item_code, 1)
-	i = ItemVariantsCacheManager(item_code)
-	i.build_cache()
-	frappe.cache().hset("item_cache_build_in_progress", item_code, 0)
+	"""Background job: rebuild the record of `item_code` under the build lock."""
+	lock = get_build_lock(item_code)
+	if not lock.acquire(blocking=True, blocking_timeout=LOCK_TIMEOUT):
+		return
+
+	record_metric("background_build")
+	try:
+		ItemVariantsCacheManager(item_code).build_cache()
+	finally:
+		release_lock(lock)
 
 
 def enqueue_build_cache(item_code):
-	if frappe.cache().hget("item_cache_build_in_progress", item_code):
-		return
 	frappe.enqueue(
 		"builder_ecommerce.ecommerce.variant_selector.item_variants_cache.build_cache",
 		item_code=item_code,
 		queue="long",
+		job_id=f"build_item_variants_cache::{item_code}",
+		deduplicate=True,
 	)
+
+
+def record_metric(path):
+	"""Count a read path; counters are flushed to Redis at most every few seconds."""
+	global _metrics_flushed_at
+
+	_metrics[path] += 1
+	if time.monotonic() - _metrics_flushed_at >= METRICS_FLUSH_INTERVAL:
+		flush_metrics()
+
+
+def flush_metrics():
+	global _metrics_flushed_at
+
+	_metrics_flushed_at = time.monotonic()
+	if not _metrics:
+		return
+
+	counts = dict(_metrics)
+	_metrics.clear()
+
+	pipeline = frappe.cache().pipeline()
+	name = frappe.cache().make_key(METRICS_KEY)
+	for path, count in counts.items():
+		pipeline.hincrby(name, path, count)
+	pipeline.execute()
+
+
+def get_cache_metrics():
+	"""Return how often each read path was taken, across all processes.
+
+	hit: fresh record served, stale: stale record served while rebuilding,
+	miss_build: built inline under the lock, miss_wait: waited for another
+	builder, miss_timeout: built without storing after waiting too long,
+	background_build: rebuilt by a background job.
+	"""
+	flush_metrics()
+	# raw pipeline: the counters are plain integers, not pickled values
+	(counts,) = frappe.cache().pipeline().hgetall(frappe.cache().make_key(METRICS_KEY)).execute()
+	return {frappe.safe_decode(path): int(count) for path, count in counts.items()}
+
+
+def reset_cache_metrics():
+	_metrics.clear()
+	frappe.cache().delete_value(METRICS_KEY)
+
+
+# Document events
+
+
+def on_item_update(doc, method=None):
+	"""Patch the records of the templates affected by a change to an Item.
+
+	Changes to its Item Variant Attribute rows arrive here as well, since child
+	rows are only saved through their parent Item.
+	"""
+	before = doc.get_doc_before_save()
+	if before and get_variant_signature(before) == get_variant_signature(doc):
+		return
+
+	if doc.has_variants:
+		attributes = [d.attribute for d in doc.attributes]
+		frappe.db.after_commit.add(lambda: patch_or_rebuild(doc.name, attributes=attributes))
+
+	if before and before.variant_of and before.variant_of != doc.variant_of:
+		frappe.db.after_commit.add(
+			lambda: patch_or_rebuild(before.variant_of, variant_code=doc.name, variant_rows=[])
+		)
+
+	if doc.variant_of:
+		variant_rows = [] if doc.disabled else [(d.attribute, d.attribute_value) for d in doc.attributes]
+		frappe.db.after_commit.add(
+			lambda: patch_or_rebuild(doc.variant_of, variant_code=doc.name, variant_rows=variant_rows)
+		)
+
+
+def on_item_trash(doc, method=None):
+	if doc.has_variants:
+		ItemVariantsCacheManager(doc.name).clear_cache()
+
+	if doc.variant_of:
+		frappe.db.after_commit.add(
+			lambda: patch_or_rebuild(doc.variant_of, variant_code=doc.name, variant_rows=[])
+		)
+
+
+def on_item_rename(doc, method=None, old=None, new=None, merge=False):
+	if doc.has_variants:
+		ItemVariantsCacheManager(old).clear_cache()
+		ItemVariantsCacheManager(new).clear_cache()
+
+	if doc.variant_of:
+		frappe.db.after_commit.add(lambda: ItemVariantsCacheManager(doc.variant_of).rebuild_cache())
+
+
+def on_item_attribute_update(doc, method=None):
+	"""Patch the entry of this attribute in `ordered_attribute_values_map`."""
+	values = [d.attribute_value for d in sorted(doc.item_attribute_values, key=lambda d: d.idx)]
+	frappe.db.after_commit.add(lambda: patch_ordered_attribute_values(doc.name, values))
+
+	# templates using the attribute serve its values in this order; a common
+	# attribute is used by thousands of them, too many to patch in the request
+	frappe.enqueue(
+		"builder_ecommerce.ecommerce.variant_selector.item_variants_cache.patch_templates_with_attribute",
+		attribute=doc.name,
+		queue="long",
+		job_id=f"patch_templates_with_attribute::{doc.name}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def on_item_attribute_trash(doc, method=None):
+	frappe.db.after_commit.add(lambda: patch_ordered_attribute_values(doc.name, None))
+
+
+def get_variant_signature(doc):
+	"""The fields of an Item that end up in variant cache records."""
+	return (
+		doc.disabled,
+		doc.has_variants,
+		doc.variant_of,
+		tuple((d.attribute, d.attribute_value) for d in doc.get("attributes") or []),
+	)
+
+
+def get_templates_with_attribute(attribute):
+	return frappe.get_all(
+		"Item Variant Attribute",
+		filters={"attribute": attribute, "parenttype": "Item", "variant_of": ["is", "not set"]},
+		pluck="parent",
+		distinct=True,
+	)
+
+
+def patch_templates_with_attribute(attribute):
+	"""Background job: patch the records of every template using `attribute`."""
+	for template in get_templates_with_attribute(attribute):
+		patch_or_rebuild(template)
+
+
+def patch_or_rebuild(item_code, **kwargs):
+	if not ItemVariantsCacheManager(item_code).patch_cache(**kwargs):
+		ItemVariantsCacheManager(item_code).rebuild_cache()
+
+
+def patch_ordered_attribute_values(attribute, values):
+	ordered_attribute_values_map = frappe.cache().get_value("ordered_attribute_values_map")
+	if ordered_attribute_values_map is None:
+		# not built yet, the next read loads every attribute
+		return
+
+	if values is None:
+		ordered_attribute_values_map.pop(attribute, None)
+	else:
+		ordered_attribute_values_map[attribute] = values
+
+	frappe.cache().set_value("ordered_attribute_values_map", ordered_attribute_values_map)
@@ -3,98 +3,98 @@ import frappe
 from builder_ecommerce.ecommerce.variant_selector.item_variants_cache import \
     ItemVariantsCacheManager
 
+# the option lists are the same for every visitor, browsers and proxies may
+# reuse them for a while and revalidate with the ETag afterwards
+ATTRIBUTES_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=3600"
 
-def get_item_codes_by_attributes(attribute_filters, template_item_code=None):
-    items = []
-
-    for attribute, values in attribute_filters.items():
-        attribute_values = values
-
-        if not isinstance(attribute_values, list):
-            attribute_values = [attribute_values]
-
-        if not attribute_values:
-            continue
-
-        wheres = []
-        query_values = []
-        for attribute_value in attribute_values:
-            wheres.append("( attribute = %s and attribute_value = %s )")
-            query_values += [attribute, attribute_value]
-
-        attribute_query = " or ".join(wheres)
-
-        if template_item_code:
-            variant_of_query = "AND t2.variant_of = %s"
-            query_values.append(template_item_code)
-        else:
-            variant_of_query = ""
-
-        query = """
-			SELECT
-				t1.parent
-			FROM
-				`tabItem Variant Attribute` t1
-			WHERE
-				1 = 1
-				AND (
-					{attribute_query}
-				)
-				AND EXISTS (
-					SELECT
-						1
-					FROM
-						`tabItem` t2
-					WHERE
-						t2.name = t1.parent
-						{variant_of_query}
-				)
-			GROUP BY
-				t1.parent
-			ORDER BY
-				NULL
-		""".format(
-            attribute_query=attribute_query, variant_of_query=variant_of_query
-        )
 
-        item_codes = set([r[0] for r in frappe.db.sql(query, query_values)])  # nosemgrep
-        items.append(item_codes)
+def get_item_codes_by_attributes(attribute_filters, template_item_code=None, use_cache=True):
+    """Return the item codes of the variants that match, for every attribute in
+    `attribute_filters` (`{attribute: value or [values]}`), any of its values.
 
-    res = list(set.intersection(*items))
+    With a `template_item_code` the answer comes from the template's cached
+    variant index unless `use_cache` is off; otherwise a single grouped query
+    does the intersection. Both leave out disabled variants.
+    """
+    attribute_filters = {
+        attribute: values if isinstance(values, list) else [values]
+        for attribute, values in attribute_filters.items()
+    }
+    attribute_filters = {attribute: values for attribute, values in attribute_filters.items() if values}
+
+    if not attribute_filters:
+        return []
+
+    if template_item_code and use_cache:
+        variant_index = ItemVariantsCacheManager(template_item_code).get_variant_index()
+        return variant_index.get_items(variant_index.filter_any(attribute_filters))
+
+    wheres = []
+    query_values = []
+    for attribute, attribute_values in attribute_filters.items():
+        wheres.append(
+            "( iva.attribute = %s and iva.attribute_value in ({0}) )".format(", ".join(["%s"] * len(attribute_values)))
+        )
+        query_values += [attribute, *attribute_values]
+
+    attribute_query = " or ".join(wheres)
+
+    if template_item_code:
+        variant_of_query = "AND iva.variant_of = %s"
+        query_values.append(template_item_code)
+    else:
+        variant_of_query = ""
+
+    # a variant matches if it matched a value of every filtered attribute
+    query_values.append(len(attribute_filters))
+
+    query = """
+        SELECT
+            iva.parent
+        FROM
+            `tabItem Variant Attribute` iva
+        INNER JOIN
+            `tabItem` item ON item.name = iva.parent
+        WHERE
+            iva.parenttype = 'Item'
+            AND item.disabled = 0
+            AND (
+                {attribute_query}
+            )
+            {variant_of_query}
+        GROUP BY
+            iva.parent
+        HAVING
+            COUNT(DISTINCT iva.attribute) = %s
+        ORDER BY
+            NULL
+    """.format(
+        attribute_query=attribute_query, variant_of_query=variant_of_query
+    )
 
-    return res
+    return [r[0] for r in frappe.db.sql(query, query_values)]  # nosemgrep
 
 
 @frappe.whitelist(allow_guest=True)
 def get_attributes_and_values(item_code):
     """Build a list of attributes and their possible values.
     This will ignore the values upon selection of which there cannot exist one item.
-    """
-    item_cache = ItemVariantsCacheManager(item_code)
-    item_variants_data = item_cache.get_item_variants_data()
 
-    attributes = get_item_attributes(item_code)
-    attribute_list = [a.attribute for a in attributes]
+    The list is precomputed when the variant cache is built and served with an
+    ETag, so repeat requests are answered with a 304.
+    """
+    record = ItemVariantsCacheManager(item_code).get_record()
+    etag = f'"{record.etag}"'
 
-    valid_options = {}
-    for item_code, attribute, attribute_value in item_variants_data:
-        if attribute in attribute_list:
-            valid_options.setdefault(attribute, set()).add(attribute_value)
+    if hasattr(frappe.local, "response_headers"):
+        frappe.local.response_headers["ETag"] = etag
+        frappe.local.response_headers["Cache-Control"] = ATTRIBUTES_CACHE_CONTROL
 
-    item_attribute_values = frappe.db.get_all(
-        "Item Attribute Value", ["parent", "attribute_value", "idx"], order_by="parent asc, idx asc"
-    )
-    ordered_attribute_value_map = frappe._dict()
-    for iv in item_attribute_values:
-        ordered_attribute_value_map.setdefault(iv.parent, []).append(iv.attribute_value)
+    if frappe.request and frappe.request.headers.get("If-None-Match") == etag:
+        frappe.local.response.http_status_code = 304
+        return
 
-    # build attribute values in idx order
-    for attr in attributes:
-        valid_attribute_values = valid_options.get(attr.attribute, [])
-        ordered_values = ordered_attribute_value_map.get(attr.attribute, [])
-        attr["values"] = [v for v in ordered_values if v in valid_attribute_values]
-
-    return attributes
+    return record.attributes_and_values
 
 
 @frappe.whitelist(allow_guest=True)
@@ -109,66 +109,30 @@ def get_next_attribute_and_values(item_code, selected_attributes):
         selected_attributes = frappe.parse_json(selected_attributes)
 
     item_cache = ItemVariantsCacheManager(item_code)
-    item_variants_data = item_cache.get_item_variants_data()
-
-    attributes = get_item_attributes(item_code)
-    attribute_list = [a.attribute for a in attributes]
-    filtered_items = get_items_with_selected_attributes(item_code, selected_attributes)
+    variant_index = item_cache.get_variant_index()
 
-    valid_options_for_attributes = frappe._dict()
-
-    for a in attribute_list:
-        valid_options_for_attributes[a] = set()
-
-        selected_attribute = selected_attributes.get(a, None)
-        if selected_attribute:
-            # already selected attribute values are valid options
-            valid_options_for_attributes[a].add(selected_attribute)
-
-    for row in item_variants_data:
-        item_code, attribute, attribute_value = row
-        if (
-            item_code in filtered_items
-            and attribute not in selected_attributes
-            and attribute in attribute_list
-        ):
-            valid_options_for_attributes[attribute].add(attribute_value)
+    attribute_list = item_cache.get_attributes()
+    filtered_items = variant_index.filter(selected_attributes)
 
     optional_attributes = item_cache.get_optional_attributes()
-    exact_match = []
     # search for exact match if all selected attributes are required attributes
     if len(selected_attributes.keys()) >= (len(attribute_list) - len(optional_attributes)):
-        item_attribute_value_map = item_cache.get_item_attribute_value_map()
-        for item_code, attr_dict in item_attribute_value_map.items():
-            if item_code in filtered_items and set(attr_dict.keys()) == set(selected_attributes.keys()):
-                exact_match.append(item_code)
-
-    return exact_match[0]
+        exact_match = variant_index.filter_exact(filtered_items, selected_attributes.keys())
+        return variant_index.get_first_item(exact_match)
 
 
 def get_items_with_selected_attributes(item_code, selected_attributes):
-    item_cache = ItemVariantsCacheManager(item_code)
-    attribute_value_item_map = item_cache.get_attribute_value_item_map()
-
-    items = []
-    for attribute, value in selected_attributes.items():
-        filtered_items = attribute_value_item_map.get((attribute, value), [])
-        items.append(set(filtered_items))
-
-    return set.intersection(*items)
+    variant_index = ItemVariantsCacheManager(item_code).get_variant_index()
+    return set(variant_index.get_items(variant_index.filter(selected_attributes)))
 
 
 # utilities
 
 def get_item_attributes(item_code):
-    attributes = frappe.db.get_all(
-        "Item Variant Attribute",
-        fields=["attribute"],
-        filters={"parenttype": "Item", "parent": item_code},
-        order_by="idx asc",
-    )
+    item_cache = ItemVariantsCacheManager(item_code)
+    attributes = [frappe._dict(attribute=attribute) for attribute in item_cache.get_attributes()]
 
-    optional_attributes = ItemVariantsCacheManager(item_code).get_optional_attributes()
+    optional_attributes = item_cache.get_optional_attributes()
 
     for a in attributes:
         if a.attribute in optional_attributes:
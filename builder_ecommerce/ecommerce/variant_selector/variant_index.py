@@ -0,0 +1,122 @@
+"""Bitset index over the variants of one template.
+
+Every variant gets a bit position and every `(attribute, value)` pair a
+bitmask of the variants carrying it, so narrowing down a selection is a
+handful of integer ANDs instead of a walk over all variant rows.
+"""
+
+
+class VariantIndex:
+    def __init__(self, variants, value_masks, attribute_masks):
+        # bit i of every mask stands for variants[i]
+        self.variants = variants
+        # (attribute, value) => mask of the variants with that value
+        self.value_masks = value_masks
+        # attribute => mask of the variants that have the attribute at all
+        self.attribute_masks = attribute_masks
+        self.all_mask = (1 << len(variants)) - 1
+
+    @classmethod
+    def from_rows(cls, item_variants_data):
+        """Build the index from `(item_code, attribute, attribute_value)` rows."""
+        positions = {}
+        value_positions = {}
+        attribute_positions = {}
+
+        for item_code, attribute, attribute_value in item_variants_data:
+            position = positions.setdefault(item_code, len(positions))
+            value_positions.setdefault((attribute, attribute_value), []).append(position)
+            attribute_positions.setdefault(attribute, []).append(position)
+
+        size = len(positions)
+        return cls(
+            list(positions),
+            {key: to_mask(p, size) for key, p in value_positions.items()},
+            {key: to_mask(p, size) for key, p in attribute_positions.items()},
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["variants"], data["value_masks"], data["attribute_masks"])
+
+    def to_dict(self):
+        return {
+            "variants": self.variants,
+            "value_masks": self.value_masks,
+            "attribute_masks": self.attribute_masks,
+        }
+
+    def filter(self, selected_attributes):
+        """Mask of the variants matching every selected `{attribute: value}`."""
+        mask = self.all_mask
+        for attribute, value in selected_attributes.items():
+            mask &= self.value_masks.get((attribute, value), 0)
+            if not mask:
+                break
+
+        return mask
+
+    def filter_any(self, attribute_filters):
+        """Mask of the variants matching any of the values given for every
+        attribute in `{attribute: [value1, value2]}`."""
+        mask = self.all_mask
+        for attribute, values in attribute_filters.items():
+            attribute_mask = 0
+            for value in values:
+                attribute_mask |= self.value_masks.get((attribute, value), 0)
+
+            mask &= attribute_mask
+            if not mask:
+                break
+
+        return mask
+
+    def get_valid_options(self, mask, attributes):
+        """Values of `attributes` that at least one variant in `mask` has."""
+        valid_options = {attribute: set() for attribute in attributes}
+        for (attribute, value), value_mask in self.value_masks.items():
+            if attribute in valid_options and value_mask & mask:
+                valid_options[attribute].add(value)
+
+        return valid_options
+
+    def filter_exact(self, mask, attributes):
+        """Mask of the variants in `mask` that have exactly the given set of attributes."""
+        for attribute in attributes:
+            if attribute not in self.attribute_masks:
+                return 0
+
+        for attribute, attribute_mask in self.attribute_masks.items():
+            if attribute in attributes:
+                mask &= attribute_mask
+            else:
+                mask &= ~attribute_mask
+
+            if not mask:
+                break
+
+        return mask
+
+    def get_items(self, mask):
+        """Item codes of the variants in `mask`, in index order."""
+        return [self.variants[i] for i, bit in enumerate(reversed(bin(mask)[2:])) if bit == "1"]
+
+    def get_first_item(self, mask):
+        if not mask:
+            return None
+
+        return self.variants[(mask & -mask).bit_length() - 1]
+
+    @staticmethod
+    def count(mask):
+        return mask.bit_count()
+
+
+def to_mask(positions, size):
+    # OR-ing `1 << position` into a growing int is quadratic for large
+    # templates, set the bits in a buffer and convert once instead
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+
+    return int.from_bytes(buffer, "little")
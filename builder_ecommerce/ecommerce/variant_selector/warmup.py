@@ -0,0 +1,227 @@
+import pickle
+import resource
+import time
+from itertools import groupby
+
+import frappe
+
+from builder_ecommerce.ecommerce.locks import release_lock
+from builder_ecommerce.ecommerce.variant_selector.item_variants_cache import (
+	CACHE_KEY,
+	ItemVariantsCacheManager,
+	get_build_lock,
+	get_memo,
+	make_record,
+)
+
+# templates written per Redis pipeline
+BATCH_SIZE = 500
+
+# Hashes of earlier cache layouts: the per-map hashes of the original cache and
+# the single-record hash before the compact encoding. They are not read any
+# more, a deploy starts from a cold cache and the warmup drops them.
+OBSOLETE_CACHE_KEYS = (
+	"attribute_value_item_map",
+	"item_attribute_value_map",
+	"item_variants_data",
+	"optional_attributes",
+	"item_cache_build_in_progress",
+	"item_variants_cache",
+)
+
+WARMUP_LOCK_TIMEOUT = 60 * 60
+
+
+def warm_variant_caches(batch_size=BATCH_SIZE):
+	"""Build the variant cache record of every enabled template with variants.
+
+	All Item Variant Attribute rows are read in two bulk queries, the variant
+	rows streamed in template order, and the records are written through Redis
+	pipelines. Only one warmup runs at a time; concurrent calls return None.
+	Returns the timing and peak memory of each phase.
+
+	Each record is written under the build lock of its template, and records
+	built or patched since the warmup started are left alone, see write_records.
+	"""
+	lock = frappe.cache().lock(frappe.cache().make_key("item_variants_cache_warmup"), timeout=WARMUP_LOCK_TIMEOUT)
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		return _warm_variant_caches(batch_size)
+	finally:
+		release_lock(lock)
+
+
+def _warm_variant_caches(batch_size):
+	report = WarmupReport()
+	started_at = time.time()
+
+	with report.phase("ordered_attribute_values"):
+		frappe.cache().delete_value("ordered_attribute_values_map")
+		ordered_attribute_values = ItemVariantsCacheManager(None).get_ordered_attribute_values()
+
+	with report.phase("template_attributes"):
+		template_attributes = get_template_attributes()
+
+	records = {}
+
+	with report.phase("variants"):
+		for template, rows in groupby(iter_variant_rows(), key=lambda row: row[0]):
+			attributes = template_attributes.pop(template, None)
+			if attributes is None:
+				# variant of a disabled template or of an item without variants
+				continue
+
+			rows = [row[1:] for row in rows]
+			records[template] = make_record(attributes, rows, ordered_attribute_values)
+			report.variant_rows += len(rows)
+
+			if len(records) >= batch_size:
+				report.templates += write_records(records, started_at)
+				records = {}
+
+		# templates whose variants are all disabled
+		for template, attributes in template_attributes.items():
+			records[template] = make_record(attributes, [], ordered_attribute_values)
+			if len(records) >= batch_size:
+				report.templates += write_records(records, started_at)
+				records = {}
+
+		report.templates += write_records(records, started_at)
+
+	frappe.cache().delete_value(list(OBSOLETE_CACHE_KEYS))
+
+	return report.as_dict()
+
+
+def write_records(records, started_at):
+	"""Store a batch of template records through one pipeline and return how many were written.
+
+	A template is skipped while another builder holds its lock, and when its
+	stored record was built after `started_at`: it was patched or rebuilt from
+	newer data than the warmup read.
+	"""
+	locks = {}
+	try:
+		for template in records:
+			lock = get_build_lock(template)
+			if lock.acquire(blocking=False):
+				locks[template] = lock
+
+		if not locks:
+			return 0
+
+		cache_key = frappe.cache().make_key(CACHE_KEY)
+		templates = list(locks)
+		pipeline = frappe.cache().pipeline(transaction=False)
+		written = 0
+		for template, val in zip(templates, frappe.cache().hmget(cache_key, templates)):
+			if val is not None and pickle.loads(val).get("built_at", 0) > started_at:
+				continue
+
+			pipeline.hset(cache_key, template, pickle.dumps(records[template]))
+			get_memo().pop(template, None)
+			written += 1
+
+		pipeline.execute()
+		return written
+	finally:
+		for lock in locks.values():
+			release_lock(lock)
+
+
+def get_template_attributes():
+	"""Ordered attributes of every enabled template, in one query."""
+	rows = frappe.db.sql(
+		"""
+		SELECT
+			iva.parent, iva.attribute
+		FROM
+			`tabItem Variant Attribute` iva
+		INNER JOIN
+			`tabItem` item ON item.name = iva.parent
+		WHERE
+			iva.parenttype = 'Item'
+			AND item.has_variants = 1
+			AND item.disabled = 0
+		ORDER BY
+			iva.parent, iva.idx
+		"""
+	)
+
+	template_attributes = {}
+	for template, attribute in rows:
+		template_attributes.setdefault(template, []).append(attribute)
+
+	return template_attributes
+
+
+def iter_variant_rows():
+	"""Stream `(template, item_code, attribute, attribute_value)` of every
+	enabled variant, grouped by template."""
+	with frappe.db.unbuffered_cursor():
+		yield from frappe.db.sql(
+			"""
+			SELECT
+				iva.variant_of, iva.parent, iva.attribute, iva.attribute_value
+			FROM
+				`tabItem Variant Attribute` iva
+			INNER JOIN
+				`tabItem` item ON item.name = iva.parent
+			WHERE
+				iva.parenttype = 'Item'
+				AND ifnull(iva.variant_of, '') != ''
+				AND item.disabled = 0
+			ORDER BY
+				iva.variant_of, iva.name
+			""",
+			as_iterator=True,
+		)
+
+
+def enqueue_warm_variant_caches():
+	"""after_migrate: deploys can change the record layout, warm in the background."""
+	frappe.enqueue(
+		"builder_ecommerce.ecommerce.variant_selector.warmup.warm_variant_caches",
+		queue="long",
+		job_id="warm_variant_caches",
+		deduplicate=True,
+	)
+
+
+class WarmupReport:
+	def __init__(self):
+		self.phases = []
+		self.templates = 0
+		self.variant_rows = 0
+
+	def phase(self, name):
+		return _Phase(self, name)
+
+	def as_dict(self):
+		return {
+			"templates": self.templates,
+			"variant_rows": self.variant_rows,
+			"seconds": round(sum(p["seconds"] for p in self.phases), 3),
+			"phases": self.phases,
+		}
+
+
+class _Phase:
+	def __init__(self, report, name):
+		self.report = report
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+
+	def __exit__(self, *exc):
+		self.report.phases.append(
+			{
+				"phase": self.name,
+				"seconds": round(time.perf_counter() - self.start, 3),
+				# peak resident memory of the process so far, in MB (ru_maxrss is in KB on Linux)
+				"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+			}
+		)
@@ -85,6 +85,8 @@ app_license = "mit"
 # before_install = "builder_ecommerce.install.before_install"
 # after_install = "builder_ecommerce.install.after_install"
 
+after_migrate = "builder_ecommerce.ecommerce.variant_selector.warmup.enqueue_warm_variant_caches"
+
 # Uninstallation
 # ------------
 
@@ -137,34 +139,84 @@ app_license = "mit"
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-# 	"*": {
-# 		"on_update": "method",
-# 		"on_cancel": "method",
-# 		"on_trash": "method"
-# 	}
-# }
+doc_events = {
+	"Item": {
+		"on_update": [
+			"builder_ecommerce.ecommerce.variant_selector.item_variants_cache.on_item_update",
+			"builder_ecommerce.ecommerce.shopping_cart.item_details.clear_item_details",
+		],
+		"on_trash": [
+			"builder_ecommerce.ecommerce.variant_selector.item_variants_cache.on_item_trash",
+			"builder_ecommerce.ecommerce.shopping_cart.item_details.clear_item_details",
+			"builder_ecommerce.ecommerce.shopping_cart.item_prices.clear_item_prices_of_item",
+		],
+		"after_rename": [
+			"builder_ecommerce.ecommerce.variant_selector.item_variants_cache.on_item_rename",
+			"builder_ecommerce.ecommerce.shopping_cart.item_details.clear_item_details",
+			"builder_ecommerce.ecommerce.shopping_cart.item_prices.clear_item_prices_of_item",
+		],
+	},
+	"Item Price": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.item_prices.clear_item_price",
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.item_prices.clear_item_price",
+	},
+	"Quotation": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.cart_session.on_quotation_change",
+		"on_submit": "builder_ecommerce.ecommerce.shopping_cart.cart_session.on_quotation_change",
+		"on_cancel": "builder_ecommerce.ecommerce.shopping_cart.cart_session.on_quotation_change",
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.cart_session.on_quotation_change",
+	},
+	"Contact": {
+		"on_update": [
+			"builder_ecommerce.ecommerce.shopping_cart.cart_session.on_contact_change",
+			"builder_ecommerce.ecommerce.shopping_cart.guest_customers.on_contact_change",
+		],
+		"on_trash": [
+			"builder_ecommerce.ecommerce.shopping_cart.cart_session.on_contact_change",
+			"builder_ecommerce.ecommerce.shopping_cart.guest_customers.on_contact_change",
+		],
+	},
+	"Customer": {
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.cart_session.on_party_change",
+		"after_rename": "builder_ecommerce.ecommerce.shopping_cart.cart_session.on_party_change",
+	},
+	"Global Defaults": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+	},
+	"Sales Taxes and Charges Template": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+		"after_rename": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+	},
+	"Shipping Rule": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+		"after_rename": "builder_ecommerce.ecommerce.shopping_cart.checkout_config.clear_checkout_config",
+	},
+	"Address": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.addresses.clear_address_display",
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.addresses.clear_address_display",
+		"after_rename": "builder_ecommerce.ecommerce.shopping_cart.addresses.clear_address_display",
+	},
+	"Address Template": {
+		"on_update": "builder_ecommerce.ecommerce.shopping_cart.addresses.on_address_template_change",
+		"on_trash": "builder_ecommerce.ecommerce.shopping_cart.addresses.on_address_template_change",
+		"after_rename": "builder_ecommerce.ecommerce.shopping_cart.addresses.on_address_template_change",
+	},
+	"Item Attribute": {
+		"on_update": "builder_ecommerce.ecommerce.variant_selector.item_variants_cache.on_item_attribute_update",
+		"on_trash": "builder_ecommerce.ecommerce.variant_selector.item_variants_cache.on_item_attribute_trash",
+	},
+}
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"builder_ecommerce.tasks.all"
-# 	],
-# 	"daily": [
-# 		"builder_ecommerce.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"builder_ecommerce.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"builder_ecommerce.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"builder_ecommerce.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+	"daily_long": [
+		"builder_ecommerce.ecommerce.variant_selector.warmup.warm_variant_caches",
+	],
+}
 
 # Testing
 # -------
@@ -6,10 +6,15 @@ document.addEventListener("DOMContentLoaded", function () {
     "x-requested-with": "XMLHttpRequest",
     Accept: "application/json, text/javascript, */*; q=0.01"
   }
+  const CHECKOUT_POLL_INTERVAL = 1000
+  // give up polling after two minutes, e.g. when the checkout job was lost
+  const CHECKOUT_POLL_ATTEMPTS = 120
 
   get_cart_count()
   if (window.location.pathname === "/cart" || window.location.pathname === "/checkout") {
     const placeOrderBtn = document.getElementById("place-order")
+    // sent with every submission of the form, so double submits place one order
+    let checkoutKey = new_idempotency_key()
     if (placeOrderBtn) {
       placeOrderBtn.addEventListener("submit", async function (event) {
         event.preventDefault();
@@ -20,13 +25,32 @@ document.addEventListener("DOMContentLoaded", function () {
         formData.forEach((value, key) => {
           jsonData[key] = value;
         });
-        let payload = {doc: jsonData, cart_items: frappe.get_cookie("cart_items")};
-        let response = await fetch("/api/method/builder_ecommerce.cart.place_order", {
+        let payload = {doc: jsonData, cart_items: frappe.get_cookie("cart_items"), idempotency_key: checkoutKey};
+        let response = await fetch("/api/method/builder_ecommerce.cart.start_checkout", {
           method: "POST", headers: HEADERS, body: JSON.stringify(payload)
         });
 
         let result = await response.json();
-        if (result.message) {
+        if (result.message && result.message.token) {
+          result = await wait_for_checkout(result.message.token);
+        }
+
+        // submissions made while this one was pending got the same answer, the next one is a new order
+        checkoutKey = new_idempotency_key()
+
+        if (result.message && result.message.status === "failed") {
+          Toastify({
+            text: result.message.error || "Your order could not be placed, please try again.",
+            close: true,
+            gravity: "top",
+            position: "center",
+            stopOnFocus: true,
+            style: {
+              background: "linear-gradient(to right, #ff416c, #ff4b2b)",
+            }
+          }).showToast();
+          get_cart_count()
+        } else if (result.message) {
           Toastify({
             text: "Order placed successfully!",
             close: true,
@@ -97,6 +121,38 @@ document.addEventListener("DOMContentLoaded", function () {
     get_cart_items();
   }
 
+  function new_idempotency_key() {
+    if (window.crypto && window.crypto.randomUUID) {
+      return window.crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+  }
+
+  async function wait_for_checkout(token) {
+    // the order is placed by a background job, poll its status until it is done
+    for (let attempt = 0; attempt < CHECKOUT_POLL_ATTEMPTS; attempt++) {
+      await new Promise(resolve => setTimeout(resolve, CHECKOUT_POLL_INTERVAL));
+
+      let response = await fetch("/api/method/builder_ecommerce.cart.get_checkout_status", {
+        method: "POST",
+        headers: HEADERS,
+        body: JSON.stringify({token: token, cart_items: frappe.get_cookie("cart_items")})
+      });
+      let result = await response.json();
+
+      if (!result.message || ["completed", "failed"].includes(result.message.status)) {
+        return result;
+      }
+    }
+
+    return {
+      message: {
+        status: "failed",
+        error: "Your order is taking longer than expected. Please check your orders before trying again.",
+      }
+    };
+  }
+
   const searchInput = document.getElementById("search-input");
   const productSearch = document.getElementById("product_search");
 